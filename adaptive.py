@@ -0,0 +1,120 @@
+class AdaptiveSampler():
+    '''
+    Adapts the sampling interval and the ramp rate of a sweep to the signal.
+
+    The change of every device resistance per unit of the swept variable,
+    |dR|/dx, is estimated over steps of at least `step` (K, Oe, ...) relative
+    to the scale of that channel, the largest |R| seen during the sweep (so a
+    Hall signal crossing zero is not a feature), and the largest one is
+    compared to `threshold`. Above the threshold (a feature, e.g. a
+    superconducting transition) points are taken faster and the ramp is
+    slowed down by `slow_factor` until the signal drops below
+    threshold*hysteresis. Below threshold*`flat` (featureless ranges) the
+    ramp is sped up by `fast_factor`, at most to `max_rate`, and the interval
+    grows up to `max_interval`.
+    '''
+    def __init__(self, threshold, step, *, min_interval=0.1, max_interval=2.0,
+                 slow_factor=0.25, fast_factor=2.0, flat=0.1, hysteresis=0.5,
+                 smoothing=0.5, max_rate=None):
+        self.threshold = threshold
+        self.step = step
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slow_factor = slow_factor
+        self.fast_factor = fast_factor
+        self.flat = flat
+        self.hysteresis = hysteresis
+        self.smoothing = smoothing
+        self.max_rate = max_rate
+        self.start(0.27, None)
+
+    def start(self, interval, rate, max_rate=None):
+        '''`max_rate` is the limit of the instrument, e.g. 20 K/min.'''
+        self.interval = interval
+        self.rate = rate
+        self.rate_limit = max_rate
+        if self.max_rate is not None:
+            self.rate_limit = self.max_rate if max_rate is None else min(max_rate, self.max_rate)
+        self.mode = 'normal'
+        self.slope = None
+        self.x_ref = None
+        self.r_ref = None
+        self.scales = None
+
+    @property
+    def in_feature(self):
+        return self.mode == 'feature'
+
+    def _update_scales(self, resistances):
+        if self.scales is None:
+            self.scales = [0.0]*len(resistances)
+        for (i, r) in enumerate(resistances):
+            if abs(r) > self.scales[i]:     # False for NaN (zero current)
+                self.scales[i] = abs(r)
+
+    def _relative_slope(self, x, resistances):
+        dx = abs(x - self.x_ref)
+        slope = 0.0
+        for (r, r_ref, scale) in zip(resistances, self.r_ref, self.scales):
+            if scale > 0:
+                change = abs(r - r_ref)/scale/dx
+                if change == change:
+                    slope = max(slope, change)
+        return slope
+
+    def _mode(self):
+        slope, threshold = self.slope, self.threshold
+        if slope > threshold:
+            return 'feature'
+        if (self.mode == 'feature') and (slope >= threshold*self.hysteresis):
+            return 'feature'
+        if slope < threshold*self.flat:
+            return 'flat'
+        if (self.mode == 'flat') and (slope <= threshold*self.flat/self.hysteresis):
+            return 'flat'
+        return 'normal'
+
+    def _rate(self):
+        if self.mode == 'feature':
+            return self.rate*self.slow_factor
+        if self.mode == 'flat':
+            rate = self.rate*self.fast_factor
+            if self.rate_limit is not None:
+                rate = min(rate, self.rate_limit)
+            return rate
+        return self.rate
+
+    def update(self, x, resistances):
+        '''
+        Returns (interval, rate): the time to wait before the next point and the
+        new ramp rate, or None if the ramp rate should not be changed.
+        '''
+        self._update_scales(resistances)
+        if self.x_ref is None:
+            self.x_ref, self.r_ref = x, list(resistances)
+            return self.interval, None
+        if abs(x - self.x_ref) < self.step:
+            return self._current_interval(), None
+
+        slope = self._relative_slope(x, resistances)
+        self.x_ref, self.r_ref = x, list(resistances)
+        if self.slope is None:
+            self.slope = slope
+        else:
+            self.slope = self.smoothing*self.slope + (1 - self.smoothing)*slope
+
+        mode = self._mode()
+        new_rate = None
+        if mode != self.mode:
+            self.mode = mode
+            if self.rate is not None:
+                new_rate = self._rate()
+        return self._current_interval(), new_rate
+
+    def _current_interval(self):
+        if self.slope is None:
+            return self.interval    # no slope estimated yet
+        if self.slope <= 0:
+            return self.max_interval
+        interval = self.interval*self.threshold/self.slope
+        return min(max(interval, self.min_interval), self.max_interval)
@@ -0,0 +1,205 @@
+'''
+Post-processing of the files written by SetupManager.create_output_files.
+
+    sweeps = load_directory(r'C:\\MeasurementData\\Dynacool\\sample\\field_sweeps')
+    pair = select(sweeps, device='xy', contacts='26', temperature=2.0)
+    grid, sym, antisym = symmetrize(pair[0]['Field (Oe)'], pair[0]['Resistance_xy26'],
+                                    pair[1]['Field (Oe)'], pair[1]['Resistance_xy26'],
+                                    grid=np.linspace(0, 90000, 181))
+'''
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from compressed import open_data_file
+
+
+FILENAME_PATTERN = re.compile(
+    r'^(?P<name>.*?)_R(?P<device>[^_]+)_cont(?P<contacts>[^_]+)'
+    r'_sweep(?P<sweep>[^_]+)(?P<labels>.*?)'
+    r'(?:_t(?P<timestamp>\d+-\d+-\d+_\d+-\d+-\d+\.\d+))?$')
+LABEL_PATTERN = re.compile(r'_([^_=]+=)([^_]*)')
+LABEL_UNITS = {'T=': ('temperature', 'K', 1.0),
+               'H=': ('field', 'T', 1e4),
+               'Deg=': ('position', 'Deg', 1.0)}
+
+
+def parse_filename(path):
+    '''
+    Splits a SetupManager file name into its labels, e.g.
+    test_Rxx_cont23_sweepField_T=1.8K_Deg=30.0Deg_t2024-1-31_12-0-0.5.dat ->
+    {'name': 'test', 'device': 'xx', 'contacts': '23', 'sweep': 'Field',
+     'labels': {'T=': '1.8K', 'Deg=': '30.0Deg'}, 'temperature': 1.8,
+     'position': 30.0, 'timestamp': '2024-1-31_12-0-0.5'}
+    Fields are converted to Oe.
+    '''
+    basename = os.path.basename(path)
+    for ext in ('.gz', '.zst'):
+        if basename.endswith(ext):
+            basename = basename[:-len(ext)]
+    stem = os.path.splitext(basename)[0]
+    match = FILENAME_PATTERN.match(stem)
+    if match is None:
+        return None
+    meta = match.groupdict()
+    meta['labels'] = dict(LABEL_PATTERN.findall(meta['labels']))
+    for (label, value) in meta['labels'].items():
+        if label not in LABEL_UNITS:
+            continue
+        key, unit, scale = LABEL_UNITS[label]
+        try:
+            meta[key] = float(value[:-len(unit)] if value.endswith(unit) else value)*scale
+        except ValueError:
+            pass
+    return meta
+
+
+def read_header(lines):
+    title = ''
+    for (i, line) in enumerate(lines):
+        if line.startswith('TITLE,'):
+            title = line[len('TITLE,'):].strip()
+        if line.rstrip() == '[Data]':
+            columns = [column.strip().strip('"') for column in lines[i + 1].split(',')]
+            return title, columns, i + 2
+    raise Exception('No [Data] section found')
+
+
+def read_dat(path):
+    '''Returns (title, columns, data) of a MultiVu data file; empty values are NaN.'''
+    with open_data_file(path) as file:
+        lines = file.readlines()
+    title, columns, start = read_header(lines)
+    rows = [line for line in lines[start:] if line.strip() != '']
+    usecols = range(1, len(columns))
+    if len(rows) == 0:
+        return title, columns[1:], np.empty((0, len(columns) - 1))
+    try:
+        data = np.loadtxt(rows, delimiter=',', usecols=usecols, ndmin=2)
+    except ValueError:
+        # missing values (shared outputs, crash-torn last line)
+        data = np.genfromtxt(rows, delimiter=',', usecols=usecols, 
+                             invalid_raise=False, ndmin=2)
+    return title, columns[1:], data
+
+
+class SweepData():
+    def __init__(self, path):
+        self.path = path
+        self.meta = parse_filename(path) or dict()
+        self.title, self.columns, self.data = read_dat(path)
+        self.index = {column: i for (i, column) in enumerate(self.columns)}
+    
+    def __len__(self):
+        return len(self.data)
+    
+    def __repr__(self):
+        return f'SweepData({os.path.basename(self.path)!r}, rows={len(self)})'
+    
+    def column_name(self, name):
+        if name in self.index:
+            return name
+        for column in self.columns:
+            if column.startswith(name):
+                return column
+        raise KeyError(name)
+    
+    def __getitem__(self, name):
+        return self.data[:, self.index[self.column_name(name)]]
+
+
+def load_directory(path, pattern='*.dat*', *, recursive=False, workers=None, processes=False):
+    '''Loads all matching files of a directory in parallel, sorted by file name.'''
+    if recursive:
+        files = glob.glob(os.path.join(path, '**', pattern), recursive=True)
+    else:
+        files = glob.glob(os.path.join(path, pattern))
+    files.sort()
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        return list(executor.map(SweepData, files))
+
+
+def select(sweeps, *, atol=0.05, **criteria):
+    '''
+    Filters sweeps by their file name labels, e.g.
+    select(sweeps, sweep='Field', contacts='23', temperature=2.0).
+    Numeric criteria (temperature, field, position) are compared within atol.
+    '''
+    selected = []
+    for sweep in sweeps:
+        for (key, value) in criteria.items():
+            actual = sweep.meta.get(key)
+            if isinstance(value, (int, float)) and isinstance(actual, float):
+                if abs(actual - value) > atol:
+                    break
+            elif actual != value:
+                break
+        else:
+            selected.append(sweep)
+    return selected
+
+
+def bin_average(x, y, edges):
+    '''Returns (centers, mean, std, counts) of y in bins of x; empty bins are NaN.'''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    edges = np.asarray(edges)
+    bins = np.digitize(x, edges) - 1
+    valid = (bins >= 0) & (bins < len(edges) - 1) & np.isfinite(y)
+    bins = bins[valid]
+    y = y[valid]
+    n_bins = len(edges) - 1
+    counts = np.bincount(bins, minlength=n_bins)
+    sums = np.bincount(bins, weights=y, minlength=n_bins)
+    squares = np.bincount(bins, weights=y*y, minlength=n_bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums/counts
+        std = np.sqrt(np.maximum(squares/counts - mean*mean, 0))
+    centers = 0.5*(edges[1:] + edges[:-1])
+    return centers, mean, std, counts
+
+
+def interpolate(x, y, grid):
+    '''Linear interpolation of y(x) onto grid; x does not have to be sorted.'''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    valid = np.isfinite(x) & np.isfinite(y)
+    order = np.argsort(x[valid], kind='stable')
+    return np.interp(grid, x[valid][order], y[valid][order], left=np.nan, right=np.nan)
+
+
+def to_grid(sweeps, x_column, y_column, grid):
+    '''Stacks y(x) of several sweeps interpolated onto a common grid (one row per sweep).'''
+    return np.vstack([interpolate(sweep[x_column], sweep[y_column], grid) for sweep in sweeps])
+
+
+def symmetrize(field_a, r_a, field_b=None, r_b=None, *, grid):
+    '''
+    Field symmetrization of a pair of opposite sweeps (e.g. -H -> +H and
+    +H -> -H), or of one sweep covering both signs of the field:
+        sym(H) = (R_a(H) + R_b(-H))/2, antisym(H) = (R_a(H) - R_b(-H))/2
+    Returns (grid, sym, antisym).
+    '''
+    if field_b is None:
+        field_b, r_b = field_a, r_a
+    grid = np.asarray(grid)
+    r_plus = interpolate(field_a, r_a, grid)
+    r_minus = interpolate(field_b, r_b, -grid)
+    return grid, 0.5*(r_plus + r_minus), 0.5*(r_plus - r_minus)
+
+
+def hall_coefficient(field, r_xy, thickness=1.0):
+    '''
+    Hall coefficient from a linear fit of the (antisymmetrized) Hall
+    resistance vs field in Oe: R_H = dR_xy/dB * thickness, in m^3/C when the
+    thickness is given in meters (thickness=1 returns dR_xy/dB in Ohm/T).
+    '''
+    field = np.asarray(field)
+    r_xy = np.asarray(r_xy)
+    valid = np.isfinite(field) & np.isfinite(r_xy)
+    slope, _ = np.polyfit(field[valid]/1e4, r_xy[valid], 1)
+    return slope*thickness
@@ -0,0 +1,79 @@
+import queue
+import threading
+
+
+class AsyncWriter():
+    '''
+    Writes rows to the output files on a dedicated thread.
+    
+    put() enqueues a record (writer, values, timestamp) into a bounded queue
+    and returns immediately. When the queue is full, policy 'block' waits for
+    space (backpressure; with `put_timeout` an exception is raised after that
+    many seconds, a row is never lost) and policy 'drop' discards the row at
+    once; both are counted in `overflows`/`dropped`.
+    drain() waits until every queued row has been written by writer.write()
+    (see output_group.RowWriter).
+    '''
+    def __init__(self, maxsize=10000, policy='block', put_timeout=None):
+        if policy not in ('block', 'drop'):
+            raise Exception(f'Unknown overflow policy {policy}')
+        self.queue = queue.Queue(maxsize)
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self.written = 0
+        self.dropped = 0
+        self.overflows = 0
+        self.errors = 0
+        self.last_error = None
+        self.max_depth = 0
+        self.thread = threading.Thread(target=self._run, name='writer', daemon=True)
+        self.thread.start()
+    
+    def put(self, writer, values, timestamp):
+        record = (writer, values, timestamp)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.overflows += 1
+            if self.policy == 'drop':
+                self.dropped += 1
+                return False
+            try:
+                self.queue.put(record, timeout=self.put_timeout)
+            except queue.Full:
+                raise Exception(f'Writer queue is still full after {self.put_timeout} s')
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+    
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    return
+                writer, values, timestamp = record
+                writer.write(values, timestamp)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+            finally:
+                self.queue.task_done()
+    
+    def drain(self):
+        self.queue.join()
+    
+    @property
+    def stats(self):
+        last_error = repr(self.last_error) if self.last_error is not None else None
+        return dict(written=self.written, dropped=self.dropped, overflows=self.overflows,
+                    errors=self.errors, max_depth=self.max_depth, last_error=last_error)
+    
+    def close(self):
+        if not self.thread.is_alive():
+            return
+        self.drain()
+        self.queue.put(None)
+        self.thread.join()
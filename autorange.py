@@ -0,0 +1,103 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+# SR830 sensitivities (V)
+SENSITIVITIES = [2e-9, 5e-9, 1e-8, 2e-8, 5e-8, 1e-7, 2e-7, 5e-7,
+                 1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4,
+                 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 0.1, 0.2, 0.5, 1.0]
+
+
+class Autoranger():
+    '''
+    Keeps the lock-in signal R = sqrt(X^2 + Y^2) between `lower` and `upper`
+    fractions of the sensitivity. A reading outside this band schedules a
+    range change on a background thread, to a range where the signal is in
+    the middle of the band (hysteresis). An overloaded reading (R above
+    `overload` of the sensitivity) is not used: the range is increased at
+    once and the point is measured again. After every change readings wait
+    `settle` time constants for the output filter to settle.
+    '''
+    def __init__(self, instrument, lock, *, upper=0.9, lower=0.1, overload=1.0,
+                 settle=5, sensitivities=None):
+        self.instrument = instrument
+        self.lock = lock
+        self.upper = upper
+        self.lower = lower
+        self.overload = overload
+        self.settle = settle
+        if sensitivities is None:
+            sensitivities = getattr(instrument, 'SENSITIVITIES', SENSITIVITIES)
+        self.sensitivities = sorted(sensitivities)
+        self.sensitivity = float(instrument.sensitivity)
+        self.time_constant = float(instrument.time_constant)
+        self.settled_at = 0.0
+        self.changes = 0
+        self._pending = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='autorange')
+
+    def _index(self, sensitivity):
+        for (i, value) in enumerate(self.sensitivities):
+            if value >= sensitivity*(1 - 1e-6):
+                return i
+        return len(self.sensitivities) - 1
+
+    def _target(self, magnitude):
+        '''Smallest sensitivity with the signal in the middle of the band.'''
+        middle = math.sqrt(self.upper*self.lower)
+        for value in self.sensitivities:
+            if magnitude <= middle*value:
+                return value
+        return self.sensitivities[-1]
+
+    def _apply(self, sensitivity):
+        # called with the lock held
+        self.instrument.sensitivity = sensitivity
+        self.sensitivity = float(sensitivity)
+        self.changes += 1
+        self.settled_at = time.perf_counter() + self.settle*self.time_constant
+
+    def _change(self, sensitivity):
+        with self.lock:
+            self._apply(sensitivity)
+
+    def settling(self):
+        '''True while a range change is pending or the filter settles (lock held by the caller).'''
+        if (self._pending is not None) and not self._pending.done():
+            return True
+        return time.perf_counter() < self.settled_at
+
+    def wait_settled(self):
+        pending = self._pending
+        if pending is not None:
+            wait([pending])
+        remaining = self.settled_at - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def overloaded(self, x, y):
+        return max(abs(x), abs(y)) >= self.overload*self.sensitivity
+
+    def upscale(self):
+        '''Increases the range by a decade after an overload (lock held by the caller).'''
+        i = self._index(self.sensitivity)
+        if i == len(self.sensitivities) - 1:
+            return False
+        self._apply(self.sensitivities[min(i + 3, len(self.sensitivities) - 1)])
+        return True
+
+    def update(self, x, y):
+        '''Schedules a range change if the reading is outside the band.'''
+        if (self._pending is not None) and not self._pending.done():
+            return
+        magnitude = math.hypot(x, y)
+        if self.lower*self.sensitivity <= magnitude <= self.upper*self.sensitivity:
+            return
+        target = self._target(magnitude)
+        if math.isclose(target, self.sensitivity, rel_tol=1e-6):
+            return
+        self._pending = self._executor.submit(self._change, target)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
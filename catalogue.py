@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import time
+
+from analysis import parse_filename
+
+
+class MeasurementCatalogue():
+    '''
+    SQLite index of the measurement files written by SetupManager. Files are
+    added when they are created and their row counts are updated when the
+    sweep finishes, so queries never have to list or parse the data folders.
+    A shared (wide-row) file of several devices, e.g. device 'xx+xy' with
+    contacts '23+26', is found by each of its (device, contacts) pairs.
+    
+        catalogue.find(sweep='Field', temperature=2.0, contacts='23')
+    '''
+    COLUMNS = ('path', 'experiment', 'sweep', 'device', 'contacts',
+               'temperature', 'field', 'position', 'labels', 'title',
+               'config', 'created', 'rows', 'finished')
+    
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    experiment TEXT, sweep TEXT, device TEXT, contacts TEXT,
+                    temperature REAL, field REAL, position REAL,
+                    labels TEXT, title TEXT, config TEXT,
+                    created REAL, rows INTEGER DEFAULT 0, finished INTEGER DEFAULT 0)''')
+            self.connection.execute('''
+                CREATE INDEX IF NOT EXISTS files_lookup
+                ON files (sweep, contacts, temperature, field)''')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS channels (
+                    path TEXT, device TEXT, contacts TEXT,
+                    PRIMARY KEY (path, device, contacts))''')
+            # files catalogued before the channels table existed
+            for row in self.connection.execute('''
+                    SELECT path, device, contacts FROM files
+                    WHERE path NOT IN (SELECT path FROM channels)''').fetchall():
+                self._add_channels(row['path'], row['device'], row['contacts'])
+    
+    def _add_channels(self, path, device, contacts):
+        '''One row per (device, contacts) pair of a file, split at '+'.'''
+        devices = (device or '').split('+')
+        contact_pairs = (contacts or '').split('+')
+        if len(devices) != len(contact_pairs):
+            devices, contact_pairs = [device], [contacts]
+        self.connection.executemany('''
+            INSERT OR IGNORE INTO channels (path, device, contacts)
+            VALUES (?, ?, ?)''', [(path, d, c) for (d, c) in zip(devices, contact_pairs)])
+    
+    def add(self, path, *, experiment='', title='', config=dict()):
+        meta = parse_filename(path) or dict()
+        record = (os.path.abspath(path), experiment, meta.get('sweep'),
+                  meta.get('device'), meta.get('contacts'), meta.get('temperature'),
+                  meta.get('field'), meta.get('position'),
+                  json.dumps(meta.get('labels', {})), title, 
+                  json.dumps(config, default=str), time.time())
+        with self.connection:
+            self.connection.execute('''
+                INSERT OR IGNORE INTO files
+                (path, experiment, sweep, device, contacts, temperature, field,
+                 position, labels, title, config, created)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', record)
+            self._add_channels(record[0], meta.get('device'), meta.get('contacts'))
+    
+    def updateRows(self, path, rows, finished=True):
+        with self.connection:
+            self.connection.execute('''
+                UPDATE files SET rows = ?, finished = ? WHERE path = ?''',
+                (rows, int(finished), os.path.abspath(path)))
+    
+    def rows(self, path):
+        cursor = self.connection.execute('SELECT rows FROM files WHERE path = ?',
+                                         (os.path.abspath(path),))
+        result = cursor.fetchone()
+        return 0 if result is None else result['rows']
+    
+    def find(self, *, atol=0.05, field_atol=5.0, position_atol=0.1, **criteria):
+        '''
+        Returns matching files as dicts. Text criteria (sweep, device, contacts,
+        experiment) are matched exactly, temperature (K), field (Oe) and
+        position (Deg) within their tolerances. Device and contacts match
+        any one device of a shared file.
+        '''
+        tolerances = {'temperature': atol, 'field': field_atol, 'position': position_atol}
+        conditions = []
+        parameters = []
+        channel = {key: criteria.pop(key) for key in ('device', 'contacts') if key in criteria}
+        if len(channel) > 0:
+            conditions.append('path IN (SELECT path FROM channels WHERE '
+                              + ' AND '.join(f'{key} = ?' for key in channel) + ')')
+            parameters += list(channel.values())
+        for (key, value) in criteria.items():
+            if key not in self.COLUMNS:
+                raise Exception(f'Unknown catalogue column {key}')
+            if key in tolerances:
+                conditions.append(f'{key} BETWEEN ? AND ?')
+                parameters += [value - tolerances[key], value + tolerances[key]]
+            else:
+                conditions.append(f'{key} = ?')
+                parameters.append(value)
+        query = 'SELECT * FROM files'
+        if len(conditions) > 0:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY created'
+        records = []
+        for row in self.connection.execute(query, parameters):
+            record = dict(row)
+            record['labels'] = json.loads(record['labels'])
+            record['config'] = json.loads(record['config'])
+            records.append(record)
+        return records
+    
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,222 @@
+import datetime
+import gzip
+import io
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMMENT_COL = 'Comment'
+TIME_COL = 'Time Stamp (sec)'
+EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+# one worker keeps the blocks of every file in submission order
+_compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='compressor')
+
+
+def _compress(data: bytes, compression: str, level=None):
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=6 if level is None else level)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise Exception('zstd compression requires the "zstandard" package')
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    raise Exception(f'Unknown compression {compression}')
+
+
+def _decompress_gzip(raw: bytes):
+    chunks = []
+    while len(raw) > 0:
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            chunk = decompressor.decompress(raw)
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            # member torn by a crash
+            break
+        chunks.append(chunk)
+        raw = decompressor.unused_data
+    return b''.join(chunks)
+
+
+def _decompress_zstd(raw: bytes):
+    if zstandard is None:
+        raise Exception('Reading .zst files requires the "zstandard" package')
+    chunks = []
+    while len(raw) > 0:
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        try:
+            chunk = decompressor.decompress(raw)
+        except zstandard.ZstdError:
+            break
+        if not decompressor.eof:
+            break
+        chunks.append(chunk)
+        raw = decompressor.unused_data
+    return b''.join(chunks)
+
+
+def open_data_file(path):
+    '''
+    Opens a plain, .gz or .zst data file for reading as text. Compressed files
+    consist of independently compressed blocks; a block torn by a crash is
+    skipped, so everything flushed before is still readable.
+    '''
+    if path.endswith('.gz') or path.endswith('.zst'):
+        with open(path, 'rb') as file:
+            raw = file.read()
+        if path.endswith('.gz'):
+            data = _decompress_gzip(raw)
+        else:
+            data = _decompress_zstd(raw)
+        return io.StringIO(data.decode())
+    return open(path, 'r')
+
+
+class CompressedDataFile():
+    '''
+    Drop-in replacement of MultiVuDataFile writing the same text format into
+    a compressed file. Rows are collected in memory and every `block_rows`
+    rows (or `flush_interval` seconds) the block is compressed into an
+    independent gzip member / zstd frame on a background thread and appended
+    to the file.
+    '''
+    def __init__(self, compression='gzip', *, block_rows=200, flush_interval=10.0, level=None):
+        if compression not in EXTENSIONS:
+            raise Exception(f'Unknown compression {compression}')
+        if (compression == 'zstd') and (zstandard is None):
+            raise Exception('zstd compression requires the "zstandard" package')
+        self.compression = compression
+        self.level = level
+        self.block_rows = block_rows
+        self.flush_interval = flush_interval
+        self.columns = []
+        self.index = dict()
+        self.values = []
+        self.full_path = ''
+        self.have_written_header = False
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.futures = []
+        self.add_column(COMMENT_COL)
+        self.add_column(TIME_COL)
+        
+    def get_comment_col(self):
+        return COMMENT_COL
+    
+    def get_time_col(self):
+        return TIME_COL
+    
+    def add_column(self, label, *args, **kwargs):
+        if self.have_written_header:
+            raise Exception(f"Not adding column '{label}' because the file header has already been written")
+        if label in self.index:
+            return
+        self.index[label] = len(self.columns)
+        self.columns.append(label)
+        self.values.append('')
+    
+    def add_multiple_columns(self, column_names):
+        for name in column_names:
+            self.add_column(name)
+    
+    def _header(self, title):
+        now = datetime.datetime.now()
+        lines = ['[Header]',
+                 '; Copyright (c) 2003-2013, Quantum Design, Inc. All rights reserved.',
+                 f"FILEOPENTIME, {now.timestamp()}, {now.strftime('%m/%d/%Y, %H:%M:%S %p')}",
+                 'BYAPP, MultiVuDataFile Python class',
+                 f'TITLE, {title}',
+                 'DATATYPE, COMMENT,1',
+                 'DATATYPE, TIME,2',
+                 'TIMEMODE, SECONDS, RELATIVE',
+                 'STARTUPGROUP, All',
+                 'STARTUPAXIS, X, 2, LINEAR, AUTO',
+                 '[Data]',
+                 ','.join(f'"{column}"' for column in self.columns)]
+        return '\n'.join(lines) + '\n'
+    
+    def _existing_columns(self, file_name):
+        with open_data_file(file_name) as file:
+            for line in file:
+                if line.rstrip() == '[Data]':
+                    return [column.strip().strip('"') for column in next(file).split(',')]
+        return None
+    
+    def create_file_and_write_header(self, file_name, title, *args, **kwargs):
+        self.full_path = os.path.abspath(file_name)
+        os.makedirs(os.path.dirname(self.full_path), exist_ok=True)
+        self.have_written_header = True
+        if os.path.exists(self.full_path) and (os.path.getsize(self.full_path) > 0):
+            if self._existing_columns(self.full_path) != self.columns:
+                raise Exception(f"Failed to append to existing file '{file_name}' - mismatch in columns")
+            return
+        with open(self.full_path, 'wb') as file:
+            file.write(_compress(self._header(title).encode(), self.compression, self.level))
+    
+    def set_value(self, label, value):
+        if isinstance(value, str):
+            value = value.replace(',', ';')
+        else:
+            value = str(value)
+        self.values[self.index[label]] = value
+    
+    def get_value(self, label):
+        return self.values[self.index[label]]
+    
+    def write_data(self, get_time_now=True):
+        if not self.have_written_header:
+            raise Exception('Must write the header file before writing data.')
+        if get_time_now:
+            self.set_value(TIME_COL, datetime.datetime.now().timestamp())
+        self._append(self.values)
+        self.values = [''] * len(self.columns)
+    
+    def slots(self, labels):
+        return [self.index[label] for label in labels]
+    
+    def write_row(self, slots, values, timestamp):
+        '''Writes a row given by positions (see slots()) without touching set_value().'''
+        if not self.have_written_header:
+            raise Exception('Must write the header file before writing data.')
+        row = [''] * len(self.columns)
+        for (i, value) in zip(slots, values):
+            row[i] = str(value)
+        row[self.index[TIME_COL]] = str(timestamp)
+        self._append(row)
+    
+    def _append(self, row):
+        self.pending.append(','.join(row))
+        if ((len(self.pending) >= self.block_rows) 
+            or (time.monotonic() - self.last_flush >= self.flush_interval)):
+            self.flush(wait=False)
+    
+    def _write_block(self, rows):
+        data = _compress(('\n'.join(rows) + '\n').encode(), self.compression, self.level)
+        with self.lock:
+            with open(self.full_path, 'ab') as file:
+                file.write(data)
+                file.flush()
+    
+    def flush(self, wait=True):
+        if len(self.pending) > 0:
+            rows, self.pending = self.pending, []
+            self.futures.append(_compressor.submit(self._write_block, rows))
+        self.last_flush = time.monotonic()
+        self.futures = [future for future in self.futures if not future.done()]
+        if wait:
+            for future in self.futures:
+                future.result()
+            self.futures = []
+    
+    def close(self):
+        self.flush(wait=True)
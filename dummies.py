@@ -88,6 +88,10 @@ class DummyDynacool():
         message += f'{"Chamber":<12} {status_chamber:>12}\n'
         print(message)
         
+    def getChamber(self):
+        self._check_connection()
+        return 'Sealed'
+        
     def setTemperature(self, temp, *, rate=5, approach='fast settle'):
         self._check_connection()
         if approach not in ['fast settle', 'no overshoot']:
@@ -163,6 +167,18 @@ class DummyDynacool():
         except: pass
         return self.current_position
     
+    def isSteady(self, param: str):
+        self._check_connection()
+        if param == 'temperature':
+            return self.temperature == self.set_temperature
+        elif param == 'field':
+            return self.field == self.set_field
+        elif param == 'both':
+            return ((self.temperature == self.set_temperature)
+                    and (self.field == self.set_field))
+        else:
+            raise Exception('Wrong parameter to wait for')
+        
     def waitFor(self, param: str, timeout=0, delay=0):
         self._check_connection()
         if param == 'temperature':
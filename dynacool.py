@@ -75,6 +75,9 @@ class DynacoolCryostat():
     def getField(self):
         return self.field
     
+    def getChamber(self):
+        return self.dynacool.get_chamber()
+    
     # @temperature.setter
     # def temperature(self, value):
     #     raise Exception('Use setTemperature() to change temperature')
@@ -83,16 +86,22 @@ class DynacoolCryostat():
     # def field(self, value):
     #     raise Exception('Use setField() temperature')
 
-    def waitFor(self, parameter: str, delay=0, timeout=0):
+    def _subsystem(self, parameter):
         if parameter == 'temperature':
-            subsystem = self.dynacool.subsystem.temperature
+            return self.dynacool.subsystem.temperature
         elif parameter == 'field':
-            subsystem = self.dynacool.subsystem.field
+            return self.dynacool.subsystem.field
         elif parameter == 'both':
-            subsystem = self.dynacool.subsystem.temperature | self.dynacool.subsystem.field
+            return self.dynacool.subsystem.temperature | self.dynacool.subsystem.field
         else:
             raise Exception('Wrong parameter to wait for')
+
+    def waitFor(self, parameter: str, delay=0, timeout=0):
+        subsystem = self._subsystem(parameter)
         self.dynacool.wait_for(delay_sec=delay, timeout_sec=timeout, bitmask=subsystem)
+    
+    def isSteady(self, parameter: str):
+        return self.dynacool.is_steady(bitmask=self._subsystem(parameter))
         
 if __name__ == '__main__':
     import time
@@ -0,0 +1,69 @@
+import time
+
+
+_SNAP_XY = b'SNAP?1,2\n'
+
+
+class FastSR830():
+    '''
+    Thin wrapper of a pymeasure SR830 whose snap() talks to the VISA session
+    of the instrument directly: the command is pre-encoded, the answer is read
+    as raw bytes up to the line feed and parsed without decoding it. All other
+    attributes (sensitivity, time_constant, ...) are passed to the wrapped
+    instrument.
+    '''
+    def __init__(self, instrument, *, timeout=1000):
+        connection = getattr(getattr(instrument, 'adapter', None), 'connection', None)
+        if (connection is None) or not hasattr(connection, 'read_raw'):
+            raise Exception(f'{instrument!r} does not have a VISA session for the fast snap')
+        connection.read_termination = '\n'
+        connection.timeout = timeout
+        object.__setattr__(self, 'instrument', instrument)
+        object.__setattr__(self, 'connection', connection)
+
+    def snap(self):
+        self.connection.write_raw(_SNAP_XY)
+        x, y = self.connection.read_raw().split(b',')
+        return float(x), float(y)
+
+    def __getattr__(self, name):
+        return getattr(self.instrument, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.instrument, name, value)
+
+
+class SR830Buffer():
+    '''
+    Latched readout of an SR830: the displays show X and Y and the data
+    buffers store one point per trigger (SRAT 14), either a pulse on the rear
+    TRIG input, the TRIG command or a GPIB group execute trigger. arm() clears
+    the buffers and starts the storage, read() waits for the stored point and
+    reads X and Y back (TRCA?), i.e. the outputs at the moment of the trigger.
+    '''
+    def __init__(self, instrument, *, timeout=5.0, poll=0.002):
+        self.instrument = instrument
+        self.timeout = timeout
+        self.poll = poll
+        instrument.write('DDEF 1,0,0')
+        instrument.write('DDEF 2,0,0')
+        instrument.write('SRAT 14')
+        instrument.write('SEND 0')
+        self.arm()
+
+    def arm(self):
+        self.instrument.write('REST')
+        self.instrument.write('STRT')
+
+    def read(self):
+        deadline = time.perf_counter() + self.timeout
+        while int(self.instrument.ask('SPTS?')) < 1:
+            if time.perf_counter() > deadline:
+                raise Exception(f'No triggered point stored in {self.timeout} s')
+            time.sleep(self.poll)
+        x = float(self.instrument.ask('TRCA?1,0,1').split(',')[0])
+        y = float(self.instrument.ask('TRCA?2,0,1').split(',')[0])
+        return x, y
+
+    def close(self):
+        self.instrument.write('PAUS')
@@ -0,0 +1,146 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from reduction import RunningStats
+
+
+STAGES = ('pre_point', 'post_point', 'setpoint')
+
+
+class Hook():
+    '''
+    User callback of one stage of the sweep loops with its cost profile.
+    `stats` collects the run time of every call, `waited` the time the loop
+    spent waiting for a concurrent hook, `overruns` the calls longer than
+    `budget` seconds.
+    '''
+    def __init__(self, stage, function, *, name=None, concurrent=False,
+                 budget=None, columns=None):
+        if stage not in STAGES:
+            raise Exception(f'Unknown hook stage {stage}, expected one of {STAGES}')
+        if (columns is not None) and (stage != 'pre_point'):
+            raise Exception('Only pre_point hooks can add columns to the output')
+        self.stage = stage
+        self.function = function
+        self.name = name if name is not None else getattr(function, '__name__', repr(function))
+        self.concurrent = concurrent
+        self.budget = budget
+        self.columns = list(columns) if columns is not None else []
+        self.stats = RunningStats()
+        self.waited = 0.0
+        self.errors = 0
+        self.overruns = 0
+        self.last_error = None
+
+    def __call__(self, context):
+        start = time.perf_counter()
+        try:
+            return self.function(**context)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            return None
+        finally:
+            duration = time.perf_counter() - start
+            self.stats.add(duration)
+            if (self.budget is not None) and (duration > self.budget):
+                self.overruns += 1
+
+    @property
+    def profile(self):
+        return dict(name=self.name, stage=self.stage, concurrent=self.concurrent,
+                    calls=self.stats.count, mean=self.stats.mean, std=self.stats.std,
+                    max=self.stats.max if self.stats.count > 0 else 0.0,
+                    total=self.stats.mean*self.stats.count, waited=self.waited,
+                    errors=self.errors, overruns=self.overruns,
+                    last_error=repr(self.last_error) if self.last_error is not None else None)
+
+    def reset(self):
+        self.stats.reset()
+        self.waited = 0.0
+        self.errors = 0
+        self.overruns = 0
+        self.last_error = None
+
+
+class HookManager():
+    '''
+    Runs the hooks of a stage. Serial hooks are called in the loop thread in
+    the order they were added; hooks declared concurrent are started on a
+    worker thread, overlap with the instrument I/O that follows and are
+    collected by wait() (pre_point hooks right after the lock-ins are read,
+    the others before the next point).
+    '''
+    def __init__(self, max_workers=4):
+        self.hooks = []
+        self.max_workers = max_workers
+        self._executor = None
+        self._pending = []
+
+    def __len__(self):
+        return len(self.hooks)
+
+    def add(self, hook: Hook):
+        if any(other.name == hook.name for other in self.hooks):
+            raise Exception(f'Hook {hook.name} already exists')
+        self.hooks.append(hook)
+        return hook
+
+    def remove(self, name):
+        self.hooks = [hook for hook in self.hooks if hook.name != name]
+
+    def stage(self, stage):
+        return [hook for hook in self.hooks if hook.stage == stage]
+
+    @property
+    def columns(self):
+        columns = []
+        for hook in self.stage('pre_point'):
+            columns += hook.columns
+        return columns
+
+    def start(self, stage, context):
+        '''
+        Calls the serial hooks of `stage` and starts the concurrent ones.
+        Returns the pending calls as (hook, result or future) pairs.
+        '''
+        calls = []
+        for hook in self.stage(stage):
+            if hook.concurrent:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='hook')
+                future = self._executor.submit(hook, context)
+                calls.append((hook, future))
+                self._pending.append((hook, future))
+            else:
+                calls.append((hook, hook(context)))
+        return calls
+
+    def collect(self, calls):
+        '''Waits for the concurrent calls and returns the results of all calls.'''
+        results = []
+        for (hook, result) in calls:
+            if isinstance(result, Future):
+                start = time.perf_counter()
+                result = result.result()
+                hook.waited += time.perf_counter() - start
+            results.append((hook, result))
+        return results
+
+    def wait(self):
+        pending, self._pending = self._pending, []
+        self.collect([(hook, future) for (hook, future) in pending if not future.done()])
+
+    def profile(self, reset=False):
+        profile = [hook.profile for hook in self.hooks]
+        if reset:
+            for hook in self.hooks:
+                hook.reset()
+        return profile
+
+    def close(self):
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
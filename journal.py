@@ -0,0 +1,82 @@
+import json
+import os
+
+
+class SweepJournal():
+    '''
+    Append-only write-ahead journal of a measurement plan. Every sweep call is
+    a step; the journal records when a step starts (with its output files),
+    completed setpoints inside a step (with the output file sizes at that
+    moment) and when the step is done. Records are fsync'ed in batches of
+    `sync_every`, step boundaries are always synced.
+    '''
+    def __init__(self, path, sync_every=10):
+        self.path = path
+        self.sync_every = sync_every
+        self.steps = dict()
+        self._unsynced = 0
+        if os.path.exists(path):
+            self._load()
+        self.file = open(path, 'a')
+    
+    def _load(self):
+        valid_size = 0
+        with open(self.path, 'rb') as file:
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(record)
+                valid_size += len(line)
+        # drop a record torn by a crash, so new records start on a clean line
+        if valid_size != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as file:
+                file.truncate(valid_size)
+    
+    def _apply(self, record):
+        step = self.steps.setdefault(record['step'], dict(done=False, points=0,
+                                                          files=[], offsets=[]))
+        event = record['event']
+        if event == 'start':
+            step['points'] = 0
+        elif event == 'point':
+            step['points'] = record['index'] + 1
+        elif event == 'done':
+            step['done'] = True
+        if 'files' in record:
+            step['files'] = record['files']
+            step['offsets'] = record['offsets']
+    
+    def record(self, event, step, *, sync=False, **fields):
+        record = dict(event=event, step=step, **fields)
+        self._apply(record)
+        self.file.write(json.dumps(record) + '\n')
+        self._unsynced += 1
+        if sync or (self._unsynced >= self.sync_every):
+            self.sync()
+    
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._unsynced = 0
+        
+    def isDone(self, step):
+        return (step in self.steps) and self.steps[step]['done']
+    
+    def completedPoints(self, step):
+        if step not in self.steps:
+            return 0
+        return self.steps[step]['points']
+    
+    def outputs(self, step):
+        if step not in self.steps:
+            return [], []
+        return self.steps[step]['files'], self.steps[step]['offsets']
+    
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
@@ -0,0 +1,130 @@
+import json
+import socket
+
+import numpy as np
+
+
+class RingBuffer():
+    '''
+    Fixed-size buffer with the most recent `size` rows of a set of columns.
+    Rows are stored in a preallocated NumPy array, so appending never
+    allocates and readers can look at the data without copying it.
+    '''
+    def __init__(self, columns, size=10000):
+        self.columns = list(columns)
+        self.index = {column: i for (i, column) in enumerate(self.columns)}
+        self.size = size
+        self.data = np.full((size, len(self.columns)), np.nan)
+        self.count = 0
+    
+    def __len__(self):
+        return min(self.count, self.size)
+        
+    def append(self, values: dict):
+        row = self.data[self.count % self.size]
+        row[:] = np.nan
+        for (column, value) in values.items():
+            i = self.index.get(column)
+            if i is not None:
+                row[i] = value
+        self.count += 1
+    
+    def append_row(self, row):
+        '''Appends a row that is already in the order of `columns`.'''
+        self.data[self.count % self.size] = row
+        self.count += 1
+    
+    def views(self):
+        '''
+        Zero-copy views (older, newer) in chronological order. The views share
+        memory with the buffer, compare `count` before and after reading to
+        detect rows overwritten in the meantime.
+        '''
+        start = self.count % self.size
+        if self.count <= self.size:
+            return self.data[:0], self.data[:self.count]
+        return self.data[start:], self.data[:start]
+    
+    def snapshot(self):
+        older, newer = self.views()
+        if len(older) == 0:
+            return newer
+        return np.concatenate((older, newer))
+    
+    def column(self, name):
+        return self.snapshot()[:, self.index[name]]
+
+
+class LiveFeed():
+    '''
+    Publisher of acquired rows as JSON datagrams on localhost. Subscribers
+    register themselves by sending b'subscribe' to the feed port. Sending is
+    non-blocking and rows are dropped rather than delaying the acquisition.
+    '''
+    def __init__(self, port=5555, host='127.0.0.1'):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(self.address)
+        self.socket.setblocking(False)
+        self.subscribers = set()
+        self.dropped = 0
+    
+    def _poll_subscriptions(self):
+        while True:
+            try:
+                message, address = self.socket.recvfrom(64)
+            except (BlockingIOError, ConnectionResetError):
+                return
+            if message == b'subscribe':
+                self.subscribers.add(address)
+            elif message == b'unsubscribe':
+                self.subscribers.discard(address)
+    
+    def publish(self, values: dict):
+        self._poll_subscriptions()
+        if len(self.subscribers) == 0:
+            return
+        message = json.dumps(values).encode()
+        for address in list(self.subscribers):
+            try:
+                self.socket.sendto(message, address)
+            except (BlockingIOError, ConnectionResetError):
+                self.dropped += 1
+            except OSError:
+                self.subscribers.discard(address)
+                
+    def close(self):
+        self.socket.close()
+
+
+class LiveFeedClient():
+    def __init__(self, port=5555, host='127.0.0.1'):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, 0))
+        self.socket.sendto(b'subscribe', self.address)
+        
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args, **kwargs):
+        self.close()
+        return False
+    
+    def __iter__(self):
+        while True:
+            yield self.receive(timeout=None)
+    
+    def receive(self, timeout=1.0):
+        self.socket.settimeout(timeout)
+        try:
+            message, _ = self.socket.recvfrom(65536)
+        except socket.timeout:
+            return None
+        return json.loads(message)
+    
+    def close(self):
+        try:
+            self.socket.sendto(b'unsubscribe', self.address)
+        finally:
+            self.socket.close()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+loadtest.py measures the request throughput and latency of the cryostat
+socket path with many concurrent clients, against a running server or an
+in-process MultiVuServer stand-in (standin_server.py).
+
+    python loadtest.py --standin --clients 16 --duration 10 --latency 0.005
+    python loadtest.py --host 192.168.0.5 --port 5000 --clients 1
+
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from dynacool import DynacoolCryostat
+
+
+OPERATIONS = {
+    'temperature': lambda cryostat: cryostat.getTemperature(),
+    'field': lambda cryostat: cryostat.getField(),
+    'status': lambda cryostat: cryostat.dynacool.get_chamber(),
+}
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LoadResult():
+    '''Latencies (s) of the answered requests per operation, and the failures.'''
+    def __init__(self, operations):
+        self.latencies = {name: [] for name in operations}
+        self.errors = {name: 0 for name in operations}
+        self.connects = []
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def merge(self, latencies, errors, connects):
+        with self.lock:
+            for name in latencies:
+                self.latencies[name] += latencies[name]
+                self.errors[name] += errors[name]
+            self.connects += connects
+
+    @staticmethod
+    def _summary(latencies, errors, elapsed):
+        summary = dict(requests=len(latencies), errors=errors,
+                       throughput=len(latencies)/elapsed if elapsed > 0 else 0.0)
+        if len(latencies) > 0:
+            latencies = np.asarray(latencies)
+            summary['mean'] = float(latencies.mean())
+            for (p, value) in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+                summary[f'p{p:g}'] = float(value)
+            summary['max'] = float(latencies.max())
+        return summary
+
+    def summary(self):
+        '''Statistics per operation and over all of them ('all').'''
+        summary = {name: self._summary(self.latencies[name], self.errors[name], self.elapsed)
+                   for name in self.latencies}
+        summary['all'] = self._summary(sum(self.latencies.values(), []),
+                                       sum(self.errors.values()), self.elapsed)
+        summary['connect'] = self._summary(self.connects, 0, self.elapsed)
+        return summary
+
+    def report(self):
+        columns = ['requests', 'errors', 'throughput', 'mean'] + [f'p{p:g}' for p in PERCENTILES] + ['max']
+        lines = [f'{"":<12}' + ''.join(f'{column:>12}' for column in columns)]
+        for (name, summary) in self.summary().items():
+            line = f'{name:<12}'
+            for column in columns:
+                value = summary.get(column, np.nan)
+                if column in ('requests', 'errors'):
+                    line += f'{value:>12d}'
+                elif column == 'throughput':
+                    line += f'{value:>10.1f}/s'
+                else:
+                    line += f'{value*1e3:>10.3f}ms'
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def _worker(host, port, operations, timing, count, barrier, result, connect):
+    latencies = {name: [] for name in operations}
+    errors = {name: 0 for name in operations}
+    connects = []
+
+    def open_client():
+        start = time.perf_counter()
+        client = connect(host, port)
+        client.open()
+        connects.append(time.perf_counter() - start)
+        return client
+
+    try:
+        client = open_client()
+    except Exception:
+        barrier.abort()
+        raise
+    try:
+        barrier.wait()
+        deadline = timing['deadline']
+        i = 0
+        while (time.perf_counter() < deadline) and ((count is None) or (i < count)):
+            name = operations[i % len(operations)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                OPERATIONS[name](client)
+            except Exception:
+                # a failed request closes the MultiPyVu client: count it and reconnect
+                errors[name] += 1
+                client = None
+                client = open_client()
+            else:
+                latencies[name].append(time.perf_counter() - start)
+    finally:
+        result.merge(latencies, errors, connects)
+        if client is not None:
+            try:
+                client.closeClient()
+            except Exception:
+                pass
+
+
+def run_load(host='127.0.0.1', port=5000, *, clients=8, duration=10.0, requests=None,
+             operations=('temperature', 'field'), connect=DynacoolCryostat):
+    '''
+    Runs `clients` concurrent clients, each sending the `operations` in turn
+    for `duration` seconds (or `requests` requests per client) after all of
+    them connected. Failed requests are counted and the client reconnects.
+    Returns a LoadResult.
+    '''
+    for name in operations:
+        if name not in OPERATIONS:
+            raise Exception(f'Unknown operation {name}, expected one of {list(OPERATIONS)}')
+    operations = list(operations)
+    result = LoadResult(operations)
+    timing = {}
+
+    def begin():
+        # runs once all clients are connected, before any of them is released
+        timing['start'] = time.perf_counter()
+        timing['deadline'] = timing['start'] + (duration if duration is not None else np.inf)
+
+    barrier = threading.Barrier(clients + 1, action=begin)
+    threads = [threading.Thread(target=_worker, name=f'load-{i}', daemon=True,
+                                args=(host, port, operations, timing, requests,
+                                      barrier, result, connect))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        raise Exception(f'Not all {clients} clients could connect to {host}:{port}')
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - timing['start']
+    return result
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Load test of the cryostat socket path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--requests', type=int, default=None, help='requests per client')
+    parser.add_argument('--operations', nargs='+', default=['temperature', 'field'],
+                        choices=list(OPERATIONS))
+    parser.add_argument('--standin', action='store_true',
+                        help='run a MultiVuServer stand-in in this process')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--stall-rate', type=float, default=0.0)
+    parser.add_argument('--stall-time', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=None)
+    options = parser.parse_args(args)
+    server = None
+    if options.standin:
+        from standin_server import Faults, StandinServer
+        faults = Faults(error=options.error_rate, drop=options.drop_rate,
+                        stall=options.stall_rate, stall_time=options.stall_time)
+        server = StandinServer(options.host, options.port, latency=options.latency,
+                               jitter=options.jitter, faults=faults, seed=options.seed).start()
+    try:
+        result = run_load(options.host, options.port, clients=options.clients,
+                          duration=options.duration, requests=options.requests,
+                          operations=options.operations)
+    finally:
+        if server is not None:
+            server.stop()
+    print(f'{options.clients} clients, {result.elapsed:.1f} s')
+    print(result.report())
+    if server is not None:
+        print(f'Stand-in server: {server.stats}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+class ConsoleFormatter(logging.Formatter):
+    '''"[2024-01-31 12:00:00.000000] message", the format of the former print() output.'''
+    def format(self, record):
+        now = datetime.datetime.fromtimestamp(record.created)
+        message = '[{}] {}'.format(now, record.getMessage())
+        if record.exc_info:
+            message += '\n' + self.formatException(record.exc_info)
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    '''One JSON object per line: time, level, message and the event fields.'''
+    def format(self, record):
+        event = dict(time=datetime.datetime.fromtimestamp(record.created).isoformat(),
+                     level=record.levelname,
+                     message=' '.join(record.getMessage().split()))
+        event.update(getattr(record, 'fields', {}))
+        return json.dumps(event, default=str)
+
+
+class AsyncLogger():
+    '''
+    Logger whose records are put on an in-memory queue by the caller and
+    written to the console and/or a JSON-lines file by a background thread,
+    so the acquisition loop never waits for console or disk I/O.
+    
+    log.info('Start sweep', sweep='field') logs a message with structured
+    fields; log.event('sweep_start', 'Start sweep', ...) additionally tags
+    the record with an event name for machine-readable logs. The handlers
+    of an existing logger `name` are replaced, so `name` should be unique
+    per owner.
+    '''
+    def __init__(self, name='setupmanager', *, level=logging.INFO,
+                 console=True, json_file=None):
+        self.queue = queue.SimpleQueue()
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(logging.handlers.QueueHandler(self.queue))
+        
+        handlers = []
+        if console:
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(ConsoleFormatter())
+            handlers.append(console_handler)
+        if json_file is not None:
+            file_handler = logging.FileHandler(json_file, encoding='utf-8')
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        self.handlers = handlers
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers,
+                                                       respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+    
+    def log(self, level, message, **fields):
+        self.logger.log(level, message, extra={'fields': fields})
+    
+    def debug(self, message, **fields):
+        self.log(logging.DEBUG, message, **fields)
+    
+    def info(self, message, **fields):
+        self.log(logging.INFO, message, **fields)
+        
+    def warning(self, message, **fields):
+        self.log(logging.WARNING, message, **fields)
+    
+    def error(self, message, **fields):
+        self.log(logging.ERROR, message, **fields)
+    
+    def event(self, name, message, level=logging.INFO, **fields):
+        self.log(level, message, event=name, **fields)
+    
+    def close(self):
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
+        for handler in self.handlers:
+            handler.close()
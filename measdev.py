@@ -1,3 +1,10 @@
+import threading
+import time
+
+from autorange import Autoranger
+from fast_sr830 import FastSR830, SR830Buffer
+
+
 class MeasuringDevice():
     def __init__(self, instrument, name: str, contact_pair: str):
         self.instrument = instrument
@@ -7,10 +14,125 @@ class MeasuringDevice():
         self.x_col = f'X_{self.fullname} (V)'
         self.y_col = f'Y_{self.fullname} (V)'
         self.resis_col = f'Resistance_{self.fullname} (Ohms)'
+        self.sens_col = f'Sensitivity_{self.fullname} (V)'
+        self.overload_key = f'Overload_{self.fullname}'
+        self.time_col = f'Time_{self.fullname} (s)'
+        self.lock = threading.Lock()
+        self.autoranger = None
+        self.buffer = None
+        self.sensitivity = None
+        self.timestamps = False
+        self.snap_time = None
+        self.output = None
+        self.source_name = None
+        self.current_filename = None
+        self.config = dict()
         
     @property
     def columns(self):
-        return [self.x_col, self.y_col, self.resis_col]
+        columns = [self.x_col, self.y_col, self.resis_col]
+        if self.autoranger is not None:
+            columns.append(self.sens_col)
+        if self.timestamps:
+            columns.append(self.time_col)
+        return columns
+    
+    @property
+    def full_scale(self):
+        '''Sensitivity of the latest reading (V), or the configured one.'''
+        if self.sensitivity is not None:
+            return self.sensitivity
+        try:
+            return float(self.config.get('Sensitivity (V)'))
+        except (TypeError, ValueError):
+            return None
+    
+    def enableFastSnap(self, timeout=1000):
+        '''Reads X and Y through the raw VISA session (see fast_sr830.FastSR830).'''
+        if not isinstance(self.instrument, FastSR830):
+            self.instrument = FastSR830(self.instrument, timeout=timeout)
+    
+    def disableFastSnap(self):
+        if isinstance(self.instrument, FastSR830):
+            self.instrument = self.instrument.instrument
+    
+    def enableBufferedSnap(self, timeout=5.0):
+        '''Latches X and Y on a trigger in the data buffers (see fast_sr830.SR830Buffer).'''
+        if self.buffer is None:
+            self.buffer = SR830Buffer(self.instrument, timeout=timeout)
+    
+    def disableBufferedSnap(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+    
+    def arm(self):
+        '''Prepares the buffered readout for the next trigger, once the range has settled.'''
+        autoranger = self.autoranger
+        while True:
+            with self.lock:
+                if (autoranger is None) or not autoranger.settling():
+                    self.buffer.arm()
+                    return
+            autoranger.wait_settled()
+    
+    def read_triggered(self, moment):
+        '''
+        X and Y stored at the trigger fired at `moment` (time.perf_counter).
+        With autoranging an overloaded reading is measured again on a higher
+        range like in snap(); that reading is not latched at the trigger.
+        '''
+        autoranger = self.autoranger
+        with self.lock:
+            x, y = self.buffer.read()
+            self.snap_time = moment
+            if autoranger is None:
+                return x, y
+            self.sensitivity = autoranger.sensitivity
+            overloaded = autoranger.overloaded(x, y) and autoranger.upscale()
+        if overloaded:
+            return self.snap()
+        autoranger.update(x, y)
+        return x, y
+    
+    def enableAutorange(self, **kwargs):
+        '''See autorange.Autoranger for the parameters.'''
+        self.disableAutorange()
+        self.autoranger = Autoranger(self.instrument, self.lock, **kwargs)
+    
+    def disableAutorange(self):
+        if self.autoranger is not None:
+            self.autoranger.close()
+            self.autoranger = None
+    
+    def snap(self):
+        '''
+        Reads X and Y. With autoranging the reading waits for a range change
+        to settle, an overloaded reading is repeated on a higher range and the
+        sensitivity used is kept in `sensitivity`. The time of the reading
+        (time.perf_counter, middle of the query) is kept in `snap_time`.
+        '''
+        if self.autoranger is None:
+            start = time.perf_counter()
+            x, y = self.instrument.snap()
+            self.snap_time = (start + time.perf_counter())/2
+            return x, y
+        autoranger = self.autoranger
+        while True:
+            # the range is checked holding the lock, so a change applied
+            # meanwhile by the autoranger thread cannot slip in
+            with self.lock:
+                if not autoranger.settling():
+                    start = time.perf_counter()
+                    x, y = self.instrument.snap()
+                    self.snap_time = (start + time.perf_counter())/2
+                    self.sensitivity = autoranger.sensitivity
+                    if not autoranger.overloaded(x, y) or not autoranger.upscale():
+                        break
+                    continue
+            autoranger.wait_settled()
+        autoranger.update(x, y)
+        return x, y
     
     def _get_instrument_config(self):
         config = dict()
@@ -34,6 +156,7 @@ class MeasuringDevice():
         config_dict = self._get_instrument_config()
         if len(addition) > 0:
             config_dict.update(addition)
+        self.config = config_dict
         config_list = [f'{key}: {value}' for (key, value) in config_dict.items()]
         config = line_start + 'Lock-in configuration: '
         config += line_start + sep.join(config_list)
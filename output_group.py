@@ -0,0 +1,97 @@
+import numpy as np
+
+
+class RowLayout():
+    '''
+    Fixed row schema compiled once when the output files are created: every
+    column has an integer slot in a preallocated row buffer, so the
+    acquisition loop only assigns array elements.
+    '''
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.index = {column: i for (i, column) in enumerate(self.columns)}
+        self.row = np.full(len(self.columns), np.nan)
+    
+    def __len__(self):
+        return len(self.columns)
+    
+    def slots(self, columns):
+        return np.array([self.index[column] for column in columns], dtype=np.intp)
+    
+    def as_dict(self, row=None):
+        if row is None:
+            row = self.row
+        return dict(zip(self.columns, row.tolist()))
+
+
+class RowWriter():
+    '''
+    Writes rows (sequences in the order of `columns`) into a MultiVuDataFile
+    or CompressedDataFile. Column positions are resolved once; outputs with
+    write_row() take the values by position, others through set_value().
+    '''
+    def __init__(self, output, columns):
+        self.output = output
+        self.columns = list(columns)
+        self.time_col = output.get_time_col()
+        self.slots = None
+        if hasattr(output, 'write_row'):
+            self.slots = output.slots(self.columns)
+    
+    def write(self, values, timestamp):
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+        if self.slots is not None:
+            self.output.write_row(self.slots, values, timestamp)
+            return
+        for (column, value) in zip(self.columns, values):
+            self.output.set_value(column, value)
+        self.output.set_value(self.time_col, timestamp)
+        self.output.write_data(get_time_now=False)
+
+
+class OutputGroup():
+    '''
+    One output file and the measuring devices written into it: a single
+    device, or all devices in the shared (wide-row) mode, where every
+    acquisition point is one row with the columns of all devices.
+    '''
+    def __init__(self, output, devices, common_columns, user_columns=()):
+        self.output = output
+        self.devices = list(devices)
+        self.common_columns = list(common_columns)
+        self.user_columns = list(user_columns)
+        self.reducer = None
+        self.filename = None
+        self.rows = 0
+        self.slots = None
+        self.writer = None
+    
+    @property
+    def name(self):
+        return '_'.join(device.fullname for device in self.devices)
+    
+    @property
+    def measured_columns(self):
+        columns = []
+        for device in self.devices:
+            columns += device.columns
+        return columns
+    
+    @property
+    def columns(self):
+        return self.common_columns + self.measured_columns + self.user_columns
+    
+    @property
+    def config(self):
+        if len(self.devices) == 1:
+            return self.devices[0].config
+        return {device.fullname: device.config for device in self.devices}
+    
+    def compile(self, layout: RowLayout):
+        '''Slots of the group columns in the point layout and the writer of its rows.'''
+        self.slots = layout.slots(self.columns)
+        columns = self.columns
+        if self.reducer is not None:
+            columns = columns + self.reducer.extra_columns
+        self.writer = RowWriter(self.output, columns)
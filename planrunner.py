@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+planrunner.py runs measurement plans without editing code: a plan file
+(JSON) declares the instruments, the measuring devices and the sweeps. Every
+plan is validated and its duration estimated before anything is connected,
+the instruments are connected in parallel, and several plans run back to
+back, reusing the connections they share.
+
+    python planrunner.py --check plan.json
+    python planrunner.py cooldown.json rotation.json
+
+A plan:
+
+    {
+        "path": "C:\\\\MeasurementData\\\\Dynacool\\\\test_sample",
+        "experiment": "test_sample",
+        "instruments": {
+            "ppms": {"type": "dynacool", "host": "127.0.0.1", "port": 5000},
+            "rotator": {"type": "dynacool_dll", "host": "127.0.0.1", "remote": false},
+            "lockin_xx": {"type": "sr830", "address": "GPIB0::8::INSTR"},
+            "lockin_xy": {"type": "sr830", "address": "GPIB0::9::INSTR"}
+        },
+        "cryostat": "ppms",
+        "rotator": "rotator",
+        "devices": [
+            {"instrument": "lockin_xx", "name": "xx", "contacts": "23"},
+            {"instrument": "lockin_xy", "name": "xy", "contacts": "26"}
+        ],
+        "current_sources": [{"instrument": "lockin_xx", "resistance": 1000000}],
+        "settings": {"setSharedOutput": {}, "setReduction": {"block_size": 10}},
+        "journal": "test_sample.journal",
+        "steps": [
+            {"sweep": "sweepTemperature", "final_temperature": 280,
+             "initial_temperature": 290, "rate_to_final": 2, "interval": 0.33},
+            {"sweep": "sweepField", "final_field": 500, "initial_field": -500}
+        ]
+    }
+
+The steps take the arguments of the SetupManager sweeps, "adaptive" takes the
+arguments of adaptive.AdaptiveSampler. With a journal a plan that was
+interrupted continues at the first unfinished sweep when it is run again.
+
+"""
+
+import argparse
+import concurrent.futures
+import inspect
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from setupmanager import SetupManager
+
+
+def _dynacool(host='127.0.0.1', port=5000):
+    from dynacool import DynacoolCryostat
+    cryostat = DynacoolCryostat(host, port)
+    cryostat.open()
+    return cryostat
+
+
+def _dynacool_dll(host='127.0.0.1', port=11000, remote=True):
+    from dynacooldll import DynacoolDLL
+    return DynacoolDLL(host, port=port, remote=remote)
+
+
+def _dummy_dynacool(**kwargs):
+    from dummies import DummyDynacool
+    cryostat = DummyDynacool(**kwargs)
+    cryostat.open()
+    return cryostat
+
+
+def _sr830(address, **kwargs):
+    from pymeasure.instruments.srs import SR830
+    return SR830(address, **kwargs)
+
+
+def _dummy_lockin(**kwargs):
+    from dummies import DummyLockin
+    return DummyLockin(**kwargs)
+
+
+INSTRUMENT_TYPES = {
+    'dynacool': _dynacool,
+    'dynacool_dll': _dynacool_dll,
+    'dummy_dynacool': _dummy_dynacool,
+    'sr830': _sr830,
+    'dummy_lockin': _dummy_lockin,
+}
+
+SWEEPS = ('sweepTemperature', 'sweepField', 'sweepCurrent', 'sweepPosition',
+          'measurePositions', 'doNMeasurements', 'measureForNSeconds')
+
+SETTINGS = ('setSharedOutput', 'setFastSnap', 'setAutorange', 'setReduction',
+            'enableAsyncWriter', 'enableLiveFeed', 'setSynchronousAcquisition',
+            'setTimestamps')
+
+PLAN_KEYS = ('path', 'experiment', 'instruments', 'cryostat', 'rotator', 'devices',
+             'current_sources', 'settings', 'journal', 'start', 'steps')
+
+# limits of DynacoolCryostat.setTemperature/setField (K, K/min, Oe, Oe/s)
+TEMPERATURE_RANGE = (1.8, 400)
+TEMPERATURE_RATE_MAX = 20
+FIELD_MAX = 140000
+FIELD_RATE_MAX = 150
+
+# set point rates of measurePositions (DynacoolCryostat defaults)
+DEFAULT_TEMPERATURE_RATE = 3
+DEFAULT_FIELD_RATE = 80
+
+# state assumed by the estimate when the instruments are not connected
+DEFAULT_START = {'temperature': 300.0, 'field': 0.0, 'position': 0.0, 'current': 0.0}
+
+# fixed sleeps of a sweep (folder change, settling of the set points)
+SWEEP_OVERHEAD = 3.0
+
+
+def load_plan(path):
+    with open(path, 'r') as file:
+        plan = json.load(file)
+    plan.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return plan
+
+
+def _arguments(step):
+    return {key: value for (key, value) in step.items() if key != 'sweep'}
+
+
+def _arguments_of(spec):
+    return {key: value for (key, value) in spec.items() if key != 'type'}
+
+
+def _check_range(errors, where, name, value, low, high):
+    if (value is not None) and not (low <= value <= high):
+        errors.append(f'{where}: {name} = {value} outside [{low}, {high}]')
+
+
+def validate(plan):
+    '''
+    Checks a plan without connecting anything: the keys, the instrument
+    types and references, the arguments of every step against the signature
+    of its sweep, and the set points and rates against the cryostat limits.
+    Returns the list of errors (empty for a valid plan).
+    '''
+    errors = []
+    for key in plan:
+        if key not in PLAN_KEYS + ('name',):
+            errors.append(f'Unknown plan key {key!r}')
+    for key in ('path', 'experiment', 'steps'):
+        if key not in plan:
+            errors.append(f'Missing plan key {key!r}')
+
+    instruments = plan.get('instruments', {})
+    for (name, spec) in instruments.items():
+        kind = spec.get('type')
+        if kind not in INSTRUMENT_TYPES:
+            errors.append(f'Instrument {name}: unknown type {kind!r}, '
+                          f'expected one of {list(INSTRUMENT_TYPES)}')
+            continue
+        try:
+            inspect.signature(INSTRUMENT_TYPES[kind]).bind(**_arguments_of(spec))
+        except TypeError as e:
+            errors.append(f'Instrument {name}: {e}')
+    for role in ('cryostat', 'rotator'):
+        if (plan.get(role) is not None) and (plan[role] not in instruments):
+            errors.append(f'{role.capitalize()} {plan[role]!r} is not an instrument')
+    fullnames = []
+    for device in plan.get('devices', []):
+        if device.get('instrument') not in instruments:
+            errors.append(f'Device {device}: unknown instrument {device.get("instrument")!r}')
+        if ('name' not in device) or ('contacts' not in device):
+            errors.append(f'Device {device}: needs a name and contacts')
+            continue
+        fullnames.append(device['name'] + device['contacts'])
+    for source in plan.get('current_sources', []):
+        if source.get('instrument') not in instruments:
+            errors.append(f'Current source {source}: unknown instrument {source.get("instrument")!r}')
+        if not source.get('resistance', 0) > 0:
+            errors.append(f'Current source {source}: resistance must be > 0')
+        for device in source.get('devices') or []:
+            if device not in fullnames + [d['name'] for d in plan.get('devices', []) if 'name' in d]:
+                errors.append(f'Current source {source}: unknown device {device!r}')
+    for (method, kwargs) in plan.get('settings', {}).items():
+        if method not in SETTINGS:
+            errors.append(f'Unknown setting {method!r}, expected one of {list(SETTINGS)}')
+            continue
+        try:
+            inspect.signature(getattr(SetupManager, method)).bind(None, **kwargs)
+        except TypeError as e:
+            errors.append(f'Setting {method}: {e}')
+
+    uses_rotator = False
+    for (index, step) in enumerate(plan.get('steps', [])):
+        where = f'Step {index + 1} ({step.get("sweep")})'
+        sweep = step.get('sweep')
+        if sweep not in SWEEPS:
+            hint = ' (runs until interrupted, use measureForNSeconds)' if sweep == 'sweepTime' else ''
+            errors.append(f'{where}: unknown sweep{hint}, expected one of {list(SWEEPS)}')
+            continue
+        kwargs = _arguments(step)
+        try:
+            inspect.signature(getattr(SetupManager, sweep)).bind(None, **kwargs)
+        except TypeError as e:
+            errors.append(f'{where}: {e}')
+            continue
+        if sweep in ('sweepPosition', 'measurePositions'):
+            uses_rotator = True
+        if sweep == 'sweepTemperature':
+            for key in ('final_temperature', 'initial_temperature'):
+                _check_range(errors, where, key, kwargs.get(key), *TEMPERATURE_RANGE)
+            for key in ('rate_to_final', 'rate_to_initial'):
+                _check_range(errors, where, key, kwargs.get(key), 1e-9, TEMPERATURE_RATE_MAX)
+        elif sweep == 'sweepField':
+            for key in ('final_field', 'initial_field'):
+                _check_range(errors, where, key, kwargs.get(key), -FIELD_MAX, FIELD_MAX)
+            for key in ('rate_to_final', 'rate_to_initial'):
+                _check_range(errors, where, key, kwargs.get(key), 1e-9, FIELD_RATE_MAX)
+        elif sweep == 'measurePositions':
+            _check_range(errors, where, 'temperature', kwargs.get('temperature'), *TEMPERATURE_RANGE)
+            _check_range(errors, where, 'field', kwargs.get('field'), -FIELD_MAX, FIELD_MAX)
+            if len(kwargs.get('positions', [])) == 0:
+                errors.append(f'{where}: no positions')
+        elif sweep == 'sweepCurrent':
+            if not kwargs.get('step', 50e-9) > 0:
+                errors.append(f'{where}: step must be > 0')
+        if 'adaptive' in kwargs:
+            from adaptive import AdaptiveSampler
+            try:
+                inspect.signature(AdaptiveSampler).bind(**kwargs['adaptive'])
+            except TypeError as e:
+                errors.append(f'{where}: adaptive: {e}')
+    if plan.get('steps') and plan.get('cryostat') is None:
+        errors.append('The sweeps need a cryostat')
+    if uses_rotator and plan.get('rotator') is None:
+        errors.append('The position sweeps need a rotator')
+    if plan.get('devices') and not any(source.get('devices') is None
+                                       for source in plan.get('current_sources', [])):
+        errors.append('The devices need a default current source (without devices)')
+    return errors
+
+
+def _ramp(start, end, rate):
+    return abs(end - start)/rate if rate > 0 else 0.0
+
+
+def estimate(plan, start=None):
+    '''
+    Estimated duration (s) of every step from the ramp rates, the waits and
+    the measuring intervals, starting from `start` (temperature, field,
+    position, current; DEFAULT_START by default). The time the instruments
+    take to answer is not included, so a sweep with short intervals takes
+    longer. Returns a list of (step, seconds).
+    '''
+    state = dict(DEFAULT_START)
+    state.update(plan.get('start') or {})
+    state.update(start or {})
+    durations = []
+    for step in plan['steps']:
+        sweep, kwargs = step['sweep'], _arguments(step)
+        seconds = SWEEP_OVERHEAD
+        if sweep == 'sweepTemperature':
+            final = kwargs['final_temperature']
+            initial = kwargs.get('initial_temperature')
+            if initial is not None:
+                if not np.isclose(initial, state['temperature'], atol=kwargs.get('atol', 0.05), rtol=0):
+                    seconds += 60*_ramp(state['temperature'], initial, kwargs.get('rate_to_initial', 5))
+                    seconds += kwargs.get('waiting_before', 60)
+            else:
+                initial = state['temperature']
+            seconds += 60*_ramp(initial, final, kwargs.get('rate_to_final', 3))
+            seconds += kwargs.get('waiting_after', 60)
+            state['temperature'] = final
+        elif sweep == 'sweepField':
+            final = kwargs['final_field']
+            initial = kwargs.get('initial_field')
+            if initial is not None:
+                if not np.isclose(initial, state['field'], atol=kwargs.get('atol', 1), rtol=0):
+                    seconds += _ramp(state['field'], initial, kwargs.get('rate_to_initial', 80))
+                    seconds += kwargs.get('waiting_before', 60)
+            else:
+                initial = state['field']
+            seconds += _ramp(initial, final, kwargs.get('rate_to_final', 80))
+            seconds += kwargs.get('waiting_after', 60)
+            state['field'] = final
+        elif sweep == 'sweepPosition':
+            final = kwargs['final_position']
+            initial = kwargs.get('initial_position')
+            if initial is not None:
+                if not np.isclose(initial, state['position'], atol=kwargs.get('atol', 0.02), rtol=0):
+                    seconds += _ramp(state['position'], initial, kwargs.get('speed_to_initial', 5))
+                    seconds += kwargs.get('waiting_before', 60)
+            else:
+                initial = state['position']
+            seconds += _ramp(initial, final, kwargs.get('speed_to_final', 3))
+            seconds += kwargs.get('waiting_after', 60)
+            state['position'] = final
+        elif sweep == 'measurePositions':
+            temperature, field = kwargs.get('temperature'), kwargs.get('field')
+            settling = 0.0
+            if temperature is not None:
+                settling = 60*_ramp(state['temperature'], temperature, DEFAULT_TEMPERATURE_RATE)
+                state['temperature'] = temperature
+            if field is not None:
+                settling = max(settling, _ramp(state['field'], field, DEFAULT_FIELD_RATE))
+                state['field'] = field
+            if (temperature is not None) or (field is not None):
+                seconds += settling + kwargs.get('delay', 60)
+            speed = kwargs.get('speed', 3.0)
+            interval = kwargs.get('interval', 0.27)
+            position = state['position']
+            for target in kwargs['positions']:
+                seconds += _ramp(position, target, speed)
+                if not kwargs.get('continuous', False):
+                    seconds += kwargs.get('points_per_position', 3)*interval
+                position = target
+            if kwargs.get('set_zero', False):
+                seconds += _ramp(position, 0.0, speed)
+                position = 0.0
+            state['position'] = position
+        elif sweep == 'sweepCurrent':
+            final = kwargs['final_current']
+            initial = kwargs.get('initial_current', 0)
+            step_size = kwargs.get('step', 50e-9)
+            interval = kwargs.get('interval', 0.5)
+            if not np.isclose(state['current'], initial, atol=step_size, rtol=0):
+                seconds += (abs(initial - state['current'])/step_size + 1)*interval + 1.5
+            points = (abs(final - initial)/step_size + 1)*kwargs.get('points_per_current', 3)
+            seconds += points*interval
+            if kwargs.get('set_zero', True):
+                seconds += (abs(final)/step_size + 1)*interval
+                final = 0.0
+            state['current'] = final
+        elif sweep == 'doNMeasurements':
+            seconds += kwargs['N']*kwargs.get('interval', 0.27)
+        elif sweep == 'measureForNSeconds':
+            seconds += kwargs['N']
+        durations.append((step, seconds))
+    return durations
+
+
+def _format_duration(seconds):
+    hours, rest = divmod(int(round(seconds)), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{hours:d}:{minutes:02d}:{seconds:02d}'
+
+
+def describe(plan, durations):
+    lines = [f'Plan {plan["name"]}: {len(durations)} steps, '
+             f'estimated {_format_duration(sum(seconds for (_, seconds) in durations))}']
+    for (index, (step, seconds)) in enumerate(durations):
+        arguments = ', '.join(f'{key}={value!r}' for (key, value) in _arguments(step).items())
+        lines.append(f'  {index + 1:>3}. {_format_duration(seconds):>9}  {step["sweep"]}({arguments})')
+    return '\n'.join(lines)
+
+
+class InstrumentPool():
+    '''
+    Connections of the instruments of the plans, connected in parallel.
+    An instrument with the same name and specification as one already
+    connected (a later plan of the queue) reuses its connection.
+    '''
+    def __init__(self):
+        self.instruments = dict()
+        self.specs = dict()
+
+    def connect(self, specs):
+        '''Connects the instruments of `specs` not connected yet; returns them all.'''
+        pending = dict()
+        for (name, spec) in specs.items():
+            if self.specs.get(name) == spec:
+                continue
+            if name in self.instruments:
+                self._close(name)
+            pending[name] = spec
+        if len(pending) > 0:
+            self._connect(pending)
+        return {name: self.instruments[name] for name in specs}
+
+    def _connect(self, pending):
+        def open_instrument(spec):
+            start = time.perf_counter()
+            instrument = INSTRUMENT_TYPES[spec['type']](**_arguments_of(spec))
+            return instrument, time.perf_counter() - start
+
+        errors = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            futures = {name: executor.submit(open_instrument, spec)
+                       for (name, spec) in pending.items()}
+            for (name, future) in futures.items():
+                try:
+                    instrument, elapsed = future.result()
+                except Exception as e:
+                    errors.append(f'{name}: {e!r}')
+                    continue
+                self.instruments[name] = instrument
+                self.specs[name] = pending[name]
+                print(f'Connected {name} ({pending[name]["type"]}) in {elapsed:.2f} s')
+        if len(errors) > 0:
+            raise Exception('Connecting the instruments failed\n\t' + '\n\t'.join(errors))
+
+    def _close(self, name):
+        instrument = self.instruments.pop(name)
+        self.specs.pop(name, None)
+        try:
+            if hasattr(instrument, 'closeClient'):
+                instrument.closeClient()
+            elif hasattr(instrument, 'shutdown'):
+                instrument.shutdown()
+        except Exception as e:
+            print(f'Closing {name} failed: {e!r}')
+
+    def close(self):
+        for name in list(self.instruments):
+            self._close(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+
+def build_setup(plan, instruments):
+    '''SetupManager of a plan with its (connected) instruments.'''
+    from lockin_source import SR830CurrentSource
+    setup = SetupManager(path=plan['path'], experiment_name=plan['experiment'])
+    devices = plan.get('devices', [])
+    if len(devices) > 0:
+        setup.addMeasuringDevices([instruments[device['instrument']] for device in devices],
+                                  [device['name'] for device in devices],
+                                  [device['contacts'] for device in devices])
+    for source in plan.get('current_sources', []):
+        current_source = SR830CurrentSource(instruments[source['instrument']], source['resistance'])
+        setup.addCurrentSource(current_source, devices=source.get('devices'),
+                               name=source.get('name'), frequency=source.get('frequency'))
+    if plan.get('cryostat') is not None:
+        setup.addCryostat(instruments[plan['cryostat']])
+    if plan.get('rotator') is not None:
+        setup.addRotator(instruments[plan['rotator']])
+    for (method, kwargs) in plan.get('settings', {}).items():
+        getattr(setup, method)(**kwargs)
+    if plan.get('journal') is not None:
+        journal = plan['journal']
+        if not os.path.isabs(journal):
+            journal = os.path.join(plan['path'], journal)
+        setup.enableJournal(journal)
+    return setup
+
+
+def _live_start(setup):
+    start = dict()
+    if hasattr(setup, 'cryostat'):
+        start['temperature'] = setup.cryostat.temperature
+        start['field'] = setup.cryostat.field
+    if hasattr(setup, 'rotator'):
+        start['position'] = setup.rotator.position
+    if hasattr(setup, 'current_source'):
+        start['current'] = setup.current_source.current
+    return start
+
+
+def _close_setup(setup):
+    '''Stops the threads and closes the files of a setup; the instruments stay in the pool.'''
+    setup.disableWatchdog()
+    setup.hooks.close()
+    if setup.synchronous:
+        setup.setSynchronousAcquisition(False)
+    for device in setup.devices:
+        device.disableAutorange()
+    setup.closeJournal()
+    if setup.writer is not None:
+        setup.closeAsyncWriter()
+    if setup.catalogue is not None:
+        setup.catalogue.close()
+        setup.catalogue = None
+    if setup.live_feed is not None:
+        setup.live_feed.close()
+    setup.log.close()
+
+
+def run_plan(plan, pool):
+    '''Connects the instruments of a validated plan and runs its steps.'''
+    instruments = pool.connect(plan.get('instruments', {}))
+    setup = build_setup(plan, instruments)
+    try:
+        durations = estimate(plan, _live_start(setup))
+        total = sum(seconds for (_, seconds) in durations)
+        setup.log.event('plan_start', describe(plan, durations), plan=plan['name'],
+                        steps=len(durations), estimate=total)
+        start = time.perf_counter()
+        for step in plan['steps']:
+            kwargs = _arguments(step)
+            if 'adaptive' in kwargs:
+                from adaptive import AdaptiveSampler
+                kwargs['adaptive'] = AdaptiveSampler(**kwargs['adaptive'])
+            getattr(setup, step['sweep'])(**kwargs)
+        elapsed = time.perf_counter() - start
+        setup.log.event('plan_finish', f'Finish plan {plan["name"]} in {_format_duration(elapsed)}'
+                        f' (estimated {_format_duration(total)})\n', plan=plan['name'],
+                        elapsed=elapsed, estimate=total)
+    finally:
+        _close_setup(setup)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Runs measurement plans back to back')
+    parser.add_argument('plans', nargs='+', help='plan files (JSON)')
+    parser.add_argument('--check', action='store_true',
+                        help='only validate the plans and estimate their duration')
+    parser.add_argument('--keep-going', action='store_true',
+                        help='run the next plan when a plan fails')
+    options = parser.parse_args(args)
+
+    plans = []
+    invalid = False
+    for path in options.plans:
+        plan = load_plan(path)
+        errors = validate(plan)
+        if len(errors) > 0:
+            invalid = True
+            print(f'Plan {path} is not valid:\n\t' + '\n\t'.join(errors))
+            continue
+        print(describe(plan, estimate(plan)))
+        plans.append(plan)
+    if invalid:
+        return 1
+    if options.check:
+        return 0
+
+    failed = []
+    with InstrumentPool() as pool:
+        for plan in plans:
+            try:
+                run_plan(plan, pool)
+            except KeyboardInterrupt:
+                print(f'Plan {plan["name"]} interrupted by user')
+                return 1
+            except Exception as e:
+                print(f'Plan {plan["name"]} failed: {e!r}')
+                failed.append(plan['name'])
+                if not options.keep_going:
+                    break
+    return 1 if len(failed) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
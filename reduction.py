@@ -0,0 +1,195 @@
+import math
+
+
+def stat_column(column: str, stat: str):
+    '''"X_xx23 (V)" -> "X_xx23 Std (V)"'''
+    if column.endswith(')') and ' (' in column:
+        name, unit = column.rsplit(' (', 1)
+        return f'{name} {stat} ({unit}'
+    return f'{column} {stat}'
+
+
+class RunningStats():
+    '''Welford accumulator: count, mean, standard deviation, min and max in O(1) memory.'''
+    __slots__ = ('count', 'mean', '_m2', 'min', 'max')
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta/self.count
+        self._m2 += delta*(value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+    
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2/(self.count - 1))
+
+
+class SigmaClipper():
+    '''
+    Streaming outlier rejection against an exponentially weighted mean and
+    variance. A value outside the band is held back until the next value
+    decides: a value within the band again confirms the held ones as
+    outliers (counted in `rejected`), while a run of more than
+    `max_rejected` is a real level change (e.g. a transition): the estimate
+    restarts on the held values and they are kept. NaN (e.g. a resistance at
+    zero current) is passed on without entering the estimate.
+    '''
+    def __init__(self, n_sigma=5.0, memory=20, warmup=5):
+        self.n_sigma = n_sigma
+        self.alpha = 1/memory
+        self.warmup = warmup
+        self.max_rejected = max(memory//4, 2)
+        self.held = []
+        self.rejected = 0
+        self.reset()
+    
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        
+    def _update(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        alpha = max(self.alpha, 1/self.count)
+        delta = value - self.mean
+        self.mean += alpha*delta
+        self.var = (1 - alpha)*(self.var + alpha*delta*delta)
+        
+    def add(self, value):
+        '''Values to keep now: none while `value` is held back, else `value` or the held run.'''
+        if value != value:
+            return [value]
+        if self.count >= self.warmup:
+            delta = value - self.mean
+            if delta*delta > self.n_sigma*self.n_sigma*self.var:
+                self.held.append(value)
+                if len(self.held) <= self.max_rejected:
+                    return []
+                held = self.held
+                self.held = []
+                self.reset()
+                for held_value in held:
+                    self._update(held_value)
+                return held
+        self.rejected += len(self.held)
+        self.held = []
+        self._update(value)
+        return [value]
+    
+    def release(self):
+        '''Held values at the end of a setpoint are kept; the estimate starts anew.'''
+        held = self.held
+        self.held = []
+        self.reset()
+        return held
+
+
+class StreamReducer():
+    '''
+    Reduces a stream of rows (sequences in the order of `columns`) into one
+    row per block of `block_size` samples, followed by the values of
+    `extra_columns`. Every column is averaged (NaN values are left out); the
+    measured columns additionally get standard deviation and optional
+    min/max columns, and may be sigma-clipped per column: an outlier is left
+    out of its own column only and counted in the 'Rejected' column of it.
+    flush() ends the block early, e.g. when the setpoint changes.
+    '''
+    def __init__(self, columns, measured_columns, name, *, block_size=10,
+                 std=True, minmax=False, sigma_clip=None):
+        self.block_size = max(int(block_size), 1)
+        self.columns = list(columns)
+        self.measured_columns = list(measured_columns)
+        self.measured = [self.columns.index(column) for column in self.measured_columns]
+        self.std = std
+        self.minmax = minmax
+        self.stats = [RunningStats() for column in self.columns]
+        if sigma_clip is None:
+            self.clippers = []
+        else:
+            self.clippers = [(i, SigmaClipper(sigma_clip)) for i in self.measured]
+        self.count_col = f'Averaged Points_{name}'
+        self.samples = 0
+    
+    @property
+    def extra_columns(self):
+        columns = []
+        for column in self.measured_columns:
+            if self.std:
+                columns.append(stat_column(column, 'Std'))
+            if self.minmax:
+                columns.append(stat_column(column, 'Min'))
+                columns.append(stat_column(column, 'Max'))
+        columns.append(self.count_col)
+        for (i, clipper) in self.clippers:
+            columns.append(self.columns[i].rsplit(' (', 1)[0] + ' Rejected')
+        return columns
+    
+    @staticmethod
+    def _add(stats, value):
+        if value == value:
+            stats.add(value)
+    
+    def add(self, values):
+        if hasattr(values, 'tolist'):
+            values = values.tolist()
+        clipped = dict()
+        for (i, clipper) in self.clippers:
+            clipped[i] = clipper.add(values[i])
+        for (i, (stats, value)) in enumerate(zip(self.stats, values)):
+            if i not in clipped:
+                self._add(stats, value)
+                continue
+            for kept in clipped[i]:
+                self._add(stats, kept)
+        self.samples += 1
+        if self.samples >= self.block_size:
+            return self._emit()
+        return None
+    
+    def flush(self):
+        '''Ends the block, keeping the values the clippers still hold back.'''
+        for (i, clipper) in self.clippers:
+            for kept in clipper.release():
+                self._add(self.stats[i], kept)
+        return self._emit()
+    
+    def _emit(self):
+        if self.samples == 0:
+            return None
+        row = [stats.mean if stats.count > 0 else math.nan for stats in self.stats]
+        for i in self.measured:
+            stats = self.stats[i]
+            if self.std:
+                row.append(stats.std if stats.count > 0 else math.nan)
+            if self.minmax:
+                if stats.count > 0:
+                    row += [stats.min, stats.max]
+                else:
+                    row += [math.nan, math.nan]
+        row.append(self.samples)
+        for (i, clipper) in self.clippers:
+            row.append(clipper.rejected)
+            clipper.rejected = 0
+        for stats in self.stats:
+            stats.reset()
+        self.samples = 0
+        return row
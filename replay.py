@@ -0,0 +1,242 @@
+'''
+Recording and replay of the instrument I/O of a SetupManager session.
+
+    trace = TraceRecorder('session.trace.gz')
+    trace.attach(setup)                # after all instruments were added
+    setup.sweepField(...)
+    trace.close()
+
+    session = ReplaySession('session.trace.gz', speed=10)
+    session.attach(setup)              # same devices, e.g. with dummy instruments
+    setup.sweepField(...)              # same calls, recorded answers and latencies
+
+An instrument shared by several roles (e.g. the default current source,
+which is also a named one) gets a single proxy, named after its first role.
+'''
+import collections
+import gzip
+import json
+import threading
+import time
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+def _plain(value):
+    '''Values written to the trace; anything that is not plain data is kept as its repr.'''
+    if (value is None) or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for (key, item) in value.items()}
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return repr(value)
+
+
+class TraceRecorder():
+    '''
+    Writes one JSON line per instrument access: t - start (s, since the
+    recording started), d - duration (s), o - object, k - get/set/call,
+    n - attribute, a/kw - arguments, r - result or e - raised exception.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = _open(path, 'w')
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.file.write(json.dumps({'trace': 1, 'time': time.time()}) + '\n')
+
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':'))
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(line + '\n')
+
+    def wrap(self, target, name):
+        if isinstance(target, RecordingProxy):
+            return target
+        return RecordingProxy(target, name, self)
+
+    def attach(self, setup):
+        '''Replaces the instruments of `setup` by recording proxies.'''
+        proxies = dict()
+        for (name, attribute, target) in _instruments(setup):
+            if id(target) not in proxies:
+                proxies[id(target)] = self.wrap(target, name)
+            _replace(setup, attribute, proxies[id(target)])
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class RecordingProxy():
+    '''Passes every access to `target` and records it.'''
+    def __init__(self, target, name, trace):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_trace', trace)
+
+    def _record(self, kind, attribute, function, args=(), kwargs=None):
+        record = {'o': self._name, 'k': kind, 'n': attribute}
+        if args:
+            record['a'] = _plain(args)
+        if kwargs:
+            record['kw'] = _plain(kwargs)
+        start = time.perf_counter()
+        try:
+            result = function()
+        except Exception as e:
+            record['e'] = repr(e)
+            raise
+        else:
+            record['r'] = _plain(result)
+            return result
+        finally:
+            finish = time.perf_counter()
+            record['t'] = round(start - self._trace.start, 6)
+            record['d'] = round(finish - start, 6)
+            self._trace.write(record)
+
+    def __getattr__(self, attribute):
+        target = self._target
+        value = getattr(type(target), attribute, None)
+        if callable(value) and not isinstance(value, property):
+            method = getattr(target, attribute)
+            def call(*args, **kwargs):
+                return self._record('call', attribute, lambda: method(*args, **kwargs),
+                                    args, kwargs)
+            return call
+        return self._record('get', attribute, lambda: getattr(target, attribute))
+
+    def __setattr__(self, attribute, value):
+        self._record('set', attribute, lambda: setattr(self._target, attribute, value), (value,))
+
+
+class ReplayAttributeError(AttributeError):
+    '''An attribute the recorded session never accessed, e.g. a capability probe.'''
+
+
+class ReplaySession():
+    '''
+    Answers the accesses of a recorded session from its trace. Accesses are
+    matched per object and attribute in the recorded order, so concurrent
+    threads replay deterministically; every answer takes the recorded
+    latency divided by `speed` (speed=None answers at once). Only the
+    instrument latencies are scaled: the sleeps and time-driven loops of
+    SetupManager run in real time, so only speed=1 reproduces the timing of
+    the recorded session.
+    '''
+    def __init__(self, path, speed=1.0):
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.queues = collections.defaultdict(collections.deque)
+        self.kinds = collections.defaultdict(set)
+        self.objects = set()
+        with _open(path, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break   # torn last line of an interrupted recording
+                if 'o' not in record:
+                    continue
+                self.objects.add(record['o'])
+                self.kinds[(record['o'], record['n'])].add(record['k'])
+                self.queues[(record['o'], record['k'], record['n'])].append(record)
+
+    def next(self, name, kind, attribute):
+        with self.lock:
+            queue = self.queues.get((name, kind, attribute))
+            if not queue:
+                if kind not in self.kinds.get((name, attribute), ()):
+                    raise ReplayAttributeError(f'No recorded {kind} of {name}.{attribute}')
+                raise Exception(f'Replay diverged: no more recorded {kind} of {name}.{attribute}')
+            record = queue.popleft()
+        if self.speed:
+            time.sleep(record['d']/self.speed)
+        if 'e' in record:
+            if record['e'].startswith('AttributeError'):
+                # keeps getattr(instrument, name, default) and hasattr() working
+                raise AttributeError(record['e'])
+            raise Exception(f'Replayed error: {record["e"]}')
+        return record.get('r')
+
+    def kind(self, name, attribute):
+        ''''call' or 'get' as recorded, None if the attribute was never read.'''
+        kinds = self.kinds.get((name, attribute), ())
+        if 'call' in kinds:
+            return 'call'
+        if 'get' in kinds:
+            return 'get'
+        return None
+
+    def proxy(self, name):
+        if name not in self.objects:
+            raise Exception(f'No object {name} in the trace')
+        return ReplayProxy(self, name)
+
+    def attach(self, setup):
+        '''Replaces the instruments of `setup` by replay proxies.'''
+        proxies = dict()
+        for (name, attribute, target) in _instruments(setup):
+            if id(target) in proxies:
+                _replace(setup, attribute, proxies[id(target)])
+            elif name in self.objects:
+                proxies[id(target)] = self.proxy(name)
+                _replace(setup, attribute, proxies[id(target)])
+
+    @property
+    def remaining(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+
+class ReplayProxy():
+    def __init__(self, session, name):
+        object.__setattr__(self, '_session', session)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attribute):
+        session, name = self._session, self._name
+        kind = session.kind(name, attribute)
+        if kind is None:
+            raise ReplayAttributeError(f'{name}.{attribute} is not in the trace')
+        if kind == 'call':
+            return lambda *args, **kwargs: session.next(name, 'call', attribute)
+        return session.next(name, 'get', attribute)
+
+    def __setattr__(self, attribute, value):
+        self._session.next(self._name, 'set', attribute)
+
+
+def _instruments(setup):
+    '''(trace name, setup attribute, object) of every instrument of a SetupManager.'''
+    instruments = []
+    for attribute in ('cryostat', 'rotator', 'current_source'):
+        if hasattr(setup, attribute):
+            instruments.append((attribute, attribute, getattr(setup, attribute)))
+    for (name, source) in setup.current_sources.items():
+        instruments.append((f'current_source:{name}', ('current_sources', name), source))
+    for device in setup.devices:
+        instruments.append((f'device:{device.fullname}', ('device', device), device.instrument))
+    return instruments
+
+
+def _replace(setup, attribute, proxy):
+    if isinstance(attribute, tuple):
+        kind, key = attribute
+        if kind == 'device':
+            key.instrument = proxy
+            if key.autoranger is not None:
+                key.autoranger.instrument = proxy
+        else:
+            setup.current_sources[key] = proxy
+    else:
+        setattr(setup, attribute, proxy)
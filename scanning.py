@@ -0,0 +1,78 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+
+class PositionTracker():
+    '''
+    Reads the rotator position on a background thread while it moves and
+    keeps the recent (time, position) samples (time.perf_counter, middle of
+    the query), so the angle at any instant of a continuous scan can be
+    interpolated. Other queries to the same instrument should hold `lock`.
+    '''
+    def __init__(self, read, *, period=0.05, history=256):
+        self.read = read
+        self.period = period
+        self.samples = collections.deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.condition = threading.Condition()
+        self._stop = threading.Event()
+        self.thread = None
+        self.error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.stop()
+
+    def start(self):
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, name='position', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.lock:
+                    start = time.perf_counter()
+                    position = self.read()
+                    finish = time.perf_counter()
+            except Exception as e:
+                self.error = e
+            else:
+                with self.condition:
+                    self.samples.append(((start + finish)/2, position))
+                    self.condition.notify_all()
+            self._stop.wait(self.period)
+
+    @property
+    def latest(self):
+        with self.condition:
+            if len(self.samples) == 0:
+                return None
+            return self.samples[-1][1]
+
+    def at(self, moment, timeout=2.0):
+        '''
+        Position at `moment` (time.perf_counter), interpolated between the
+        samples around it. Waits up to `timeout` seconds for a sample taken
+        after `moment`; without one the latest position is returned.
+        '''
+        with self.condition:
+            self.condition.wait_for(lambda: (len(self.samples) > 0)
+                                    and (self.samples[-1][0] >= moment),
+                                    timeout=timeout)
+            if len(self.samples) == 0:
+                return np.nan
+            times, positions = zip(*self.samples)
+        return float(np.interp(moment, times, positions))
@@ -1,27 +1,139 @@
+import atexit
 import datetime
+import functools
+import threading
 import time
 import os
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 
 from MultiVuDataFile import MultiVuDataFile as mvd
 from measdev import MeasuringDevice
+from output_group import OutputGroup, RowLayout
+from reduction import StreamReducer
+from livefeed import RingBuffer, LiveFeed
+from journal import SweepJournal
+from termination import SweepTermination, isclose
+from logger import AsyncLogger
+from catalogue import MeasurementCatalogue
+from compressed import CompressedDataFile, EXTENSIONS
+from async_writer import AsyncWriter
+from hooks import Hook, HookManager
+from scanning import PositionTracker
+from watchdog import SafetyAbort, Watchdog
+from timing import CryostatTracker, LockedInstrument, MonotonicClock
 
 import numpy as np
 
 
+def _journaled(method):
+    '''
+    Makes a sweep a step of the journal (if one is enabled): steps completed
+    in a previous run of the same plan are skipped. The profile of the user
+    hooks is reported after every sweep, and the outputs are finished (the
+    incomplete reduction blocks written, the writer queue drained) also when
+    the sweep is interrupted (Ctrl+C). A sweep aborted by the watchdog is
+    not marked as done.
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.watchdog is not None:
+            self.watchdog.reset()
+        if self.journal is None:
+            try:
+                return method(self, *args, **kwargs)
+            except SafetyAbort:
+                self._safety_abort()
+                raise
+            finally:
+                self._finish_outputs()
+                self._stop_tracking()
+                self._report_hooks()
+        self._step_number += 1
+        step = f'{self._step_number}:{method.__name__}'
+        if self.journal.isDone(step):
+            msg = f'Skipping step {step} (completed in a previous run)'
+            self.log.info(msg)
+            return None
+        self._current_step = step
+        try:
+            result = method(self, *args, **kwargs)
+        except SafetyAbort:
+            self._safety_abort()
+            raise
+        finally:
+            self._finish_outputs()
+            self._current_step = None
+            self._stop_tracking()
+            self._report_hooks()
+        self.journal.record('done', step, sync=True)
+        return result
+    return wrapper
+
+
 class SetupManager():
     temp_col = 'Temperature (K)'
     field_col = 'Field (Oe)'
     current_col = 'I (A)'
     pos_col = 'Position (Deg)'
+    time_col = 'Time Stamp (sec)'
     COMMON_OUTPUT_COLUMNS = [temp_col, field_col, current_col, pos_col]
+    # ramp rate limits of the cryostat (K/min, Oe/s)
+    MAX_TEMPERATURE_RATE = 20
+    MAX_FIELD_RATE = 150
+    # longest poll of a ramp with a watchdog when the cryostat cannot report stability (s)
+    POLL_TIMEOUT = 3600
     
-    def __init__(self, path, experiment_name, ext='dat'):
+    def __init__(self, path, experiment_name, ext='dat', log_events=False, catalogue=False,
+                 compression=None):
         os.makedirs(path, exist_ok=True)
         self.base_path = path
         self.output_path = path
         self.name = experiment_name
         self.ext = ext
+        self.compression = compression
+        if compression is not None:
+            if compression not in EXTENSIONS:
+                raise Exception(f'Unknown compression {compression}')
+            self.ext = ext + EXTENSIONS[compression]
+        json_file = None
+        if log_events:
+            json_file = os.path.join(path, experiment_name + '_events.jsonl')
+        # one logger per setup: two setups of the same experiment keep their own files
+        self.log = AsyncLogger(f'setupmanager.{experiment_name}.{id(self):x}', json_file=json_file)
+        if catalogue is True:
+            catalogue = os.path.join(path, 'catalogue.sqlite')
+        self.catalogue = None
+        if catalogue:
+            self.catalogue = MeasurementCatalogue(catalogue)
         self.devices = []
+        self.current_sources = dict()
+        self.outputs = []
+        self.layout = None
+        self.one_output = False
+        self.synchronous = False
+        self.trigger = None
+        self._executor = None
+        self._barrier = None
+        self.reduction = None
+        self.live_buffer = None
+        self.live_feed = None
+        self.writer = None
+        self.journal = None
+        self.hooks = HookManager()
+        self._hook_slots = dict()
+        self._step_number = 0
+        self._current_step = None
+        self.state = dict()
+        self.watchdog = None
+        self._on_abort = None
+        self._chamber_period = 10.0
+        self._chamber_time = -np.inf
+        self.clock = MonotonicClock()
+        self.timestamps = False
+        self.tracking_period = None
+        self.cryostat_tracker = None
+        self._cryostat_lock = threading.RLock()
     
     def changeFolder(self, path):
         os.makedirs(path, exist_ok=True)
@@ -39,6 +151,7 @@ class SetupManager():
                 msg += 'or returned result can not be unpacked correctly'
                 raise Exception(msg)
             instr = MeasuringDevice(instrument, name, contact_pair)
+            instr.timestamps = self.timestamps
             self.devices.append(instr)
     
     def generateLabelsDict(labels, values):
@@ -47,18 +160,514 @@ class SetupManager():
         parameters['values'] = values
         return parameters
     
+    def setSharedOutput(self, enabled=True):
+        '''
+        In the shared output mode all devices are written into one file with
+        one row per acquisition point (common columns, then the columns of
+        every device) instead of one file per device.
+        '''
+        self.one_output = enabled
+    
+    def setFastSnap(self, enabled=True, devices=None, timeout=1000):
+        '''
+        Reads the lock-ins of `devices` (all by default) through their raw VISA
+        session instead of the pymeasure property machinery. Devices without
+        a VISA session (e.g. dummies) keep the normal snap().
+        '''
+        if devices is None:
+            devices = self.devices
+        for device in map(self._find_device, devices):
+            if not enabled:
+                device.disableFastSnap()
+                continue
+            try:
+                device.enableFastSnap(timeout=timeout)
+            except Exception as e:
+                self.log.warning(f'Fast snap is not available for {device.fullname}\n\t\t\t     {e!r}')
+    
+    def setAutorange(self, enabled=True, devices=None, **kwargs):
+        '''
+        Automatic sensitivity of the lock-ins of `devices` (all by default),
+        see autorange.Autoranger for the parameters. The sensitivity of every
+        reading is written to a 'Sensitivity_<device> (V)' column.
+        '''
+        if devices is None:
+            devices = self.devices
+        for device in map(self._find_device, devices):
+            if enabled:
+                device.enableAutorange(**kwargs)
+            else:
+                device.disableAutorange()
+    
+    def setTimestamps(self, enabled=True, *, interpolate=True, period=0.05):
+        '''
+        Time stamps every lock-in reading ('Time_<device> (s)', middle of its
+        query) and every row on one monotonic clock (timing.MonotonicClock),
+        calibrated to the system clock once per session (see calibrateClock).
+        With `interpolate` a tracker thread reads the cryostat every `period`
+        seconds during a sweep and the temperature and field of a point are
+        interpolated to the mean time of its lock-in readings, so the lag
+        between the cryostat and lock-in reads does not smear fast ramps.
+        '''
+        self.timestamps = enabled
+        for device in self.devices:
+            device.timestamps = enabled
+        self.tracking_period = period if (enabled and interpolate) else None
+        self._stop_tracking()
+        if hasattr(self, 'cryostat'):
+            self.addCryostat(self.cryostat)
+    
+    def calibrateClock(self, read_remote=None, samples=8):
+        '''
+        Recalibrates the monotonic clock to the system clock and, with
+        `read_remote` (returning the time of e.g. the MultiVu computer, s since
+        the epoch), measures the offset of that clock, which is written to the
+        headers of the output files ('Clock Offset (s)').
+        '''
+        self.clock.calibrate()
+        if read_remote is None:
+            return None
+        offset, uncertainty = self.clock.calibrate_remote(read_remote, samples=samples)
+        self.log.event('clock_offset', f'Remote clock offset {offset*1e3:+.1f} ms'
+                       f' (+-{uncertainty*1e3:.1f} ms)', offset=offset, uncertainty=uncertainty)
+        return offset
+    
+    def _track_cryostat(self):
+        if self.cryostat_tracker is None:
+            cryostat = self.cryostat
+            if isinstance(cryostat, LockedInstrument):
+                cryostat = cryostat.target
+            self.cryostat_tracker = CryostatTracker(cryostat, self._cryostat_lock,
+                                                    period=self.tracking_period)
+            self.cryostat_tracker.start()
+        return self.cryostat_tracker
+    
+    def _read_cryostat(self):
+        '''
+        Temperature and field for the next point. While the cryostat is
+        tracked its latest tracked values are used (save_datapoint
+        interpolates them anyway), so the loops do not compete with the
+        tracker for the cryostat lock.
+        '''
+        if self.tracking_period is not None:
+            latest = self._track_cryostat().latest
+            if latest is not None:
+                return latest
+        return self.cryostat.temperature, self.cryostat.field
+    
+    def _stop_tracking(self):
+        if self.cryostat_tracker is None:
+            return
+        self.cryostat_tracker.stop()
+        if self.cryostat_tracker.error is not None:
+            self.log.warning(f'Reading the cryostat failed during the sweep'
+                             f'\n\t\t\t     {self.cryostat_tracker.error!r}')
+        self.cryostat_tracker = None
+    
+    def setReduction(self, block_size=10, *, std=True, minmax=False, sigma_clip=None):
+        '''
+        Streaming reduction between acquisition and the output files: every
+        `block_size` accepted samples are written as one averaged row with
+        extra Std (and optionally Min/Max) columns. `sigma_clip` is the
+        rejection threshold in standard deviations (None disables clipping).
+        Call with block_size=1 and sigma_clip=None to write raw samples again.
+        '''
+        if (block_size <= 1) and (sigma_clip is None):
+            self.reduction = None
+        else:
+            self.reduction = dict(block_size=block_size, std=std,
+                                  minmax=minmax, sigma_clip=sigma_clip)
+    
+    def enableAsyncWriter(self, maxsize=10000, policy='block'):
+        '''
+        Hands every row to a writer thread instead of formatting and writing
+        it in the acquisition loop. With policy='block' a full queue slows the
+        loop down (backpressure), with policy='drop' rows are dropped and
+        counted. The queue is drained at the end of every sweep.
+        '''
+        self.closeAsyncWriter()
+        self.writer = AsyncWriter(maxsize=maxsize, policy=policy)
+        atexit.register(self.closeAsyncWriter)
+    
+    def closeAsyncWriter(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            atexit.unregister(self.closeAsyncWriter)
+    
+    def _write_values(self, group, values, timestamp):
+        if self.writer is not None:
+            self.writer.put(group.writer, values, timestamp)
+            return
+        group.writer.write(values, timestamp)
+    
+    def _drain_writer(self):
+        if self.writer is None:
+            return
+        self.writer.drain()
+        stats = self.writer.stats
+        if (stats['dropped'] > 0) or (stats['errors'] > 0):
+            msg = 'Writer dropped {dropped} rows, {errors} errors'.format(**stats)
+            msg += ' (max queue depth {max_depth})'.format(**stats)
+            if stats['last_error'] is not None:
+                msg += '\n\t\t\t     Last error: {last_error}'.format(**stats)
+            self.log.warning(msg, **stats)
+    
+    def addHook(self, stage, function, *, name=None, concurrent=False,
+                budget=None, columns=None):
+        '''
+        Adds a user callback to the sweep loops. Stages:
+            'pre_point'  - before the lock-ins are read, with temperature,
+                           field and position; a hook with `columns` returns
+                           their values (e.g. an extra thermometer), which are
+                           written with the point
+            'post_point' - after the point is written, additionally with
+                           resistances and timestamp
+            'setpoint'   - when a sweep sets a new target, with quantity
+                           ('temperature', 'field', 'position', 'current')
+                           and value
+        Hooks are called with keyword arguments. Concurrent hooks run on a
+        worker thread alongside the instrument I/O and must not talk to the
+        same instruments as the loop. Every call is timed (see hookProfile);
+        calls longer than `budget` seconds are counted and reported.
+        Hooks with columns must be added before the output files are created.
+        '''
+        hook = Hook(stage, function, name=name, concurrent=concurrent,
+                    budget=budget, columns=columns)
+        return self.hooks.add(hook)
+    
+    def removeHook(self, name):
+        self.hooks.remove(name)
+    
+    def hookProfile(self, reset=False):
+        return self.hooks.profile(reset=reset)
+    
+    def _run_hooks(self, stage, **context):
+        if stage == 'setpoint':
+            self._flush_reducers()
+        if len(self.hooks) > 0:
+            self.hooks.start(stage, context)
+    
+    def _report_hooks(self):
+        self.hooks.wait()
+        for profile in self.hooks.profile(reset=True):
+            if profile['calls'] == 0:
+                continue
+            msg = 'Hook {name} ({stage}): {calls} calls, mean {mean_ms:.1f} ms, max {max_ms:.1f} ms'
+            msg = msg.format(mean_ms=profile['mean']*1e3, max_ms=profile['max']*1e3, **profile)
+            if profile['concurrent']:
+                msg += ', loop waited {:.1f} ms'.format(profile['waited']*1e3)
+            if (profile['overruns'] > 0) or (profile['errors'] > 0):
+                msg += '\n\t\t\t     {overruns} calls over budget, {errors} errors'.format(**profile)
+                if profile['last_error'] is not None:
+                    msg += ' (last: {last_error})'.format(**profile)
+                self.log.warning(msg, hook=profile)
+            else:
+                self.log.event('hook_profile', msg, hook=profile)
+    
+    def enableWatchdog(self, limits, *, period=0.5, chamber_period=10.0, on_abort=None):
+        '''
+        Starts a safety watchdog thread checking `limits` (watchdog.Limit)
+        every `period` seconds against the latest state `self.state`:
+        'temperature', 'field', 'position', 'current', 'chamber', every column
+        of the last point (e.g. 'X_xx23 (V)') and 'Overload_<device>', the
+        larger of |X| and |Y| over the sensitivity. An abort raises SafetyAbort
+        out of the running sweep at its next sleep or wait, after the data is
+        written and `on_abort(setup)` (e.g. ramping the field down) was called.
+        A pause holds the sweep, polling the instruments, until the values are
+        back within their limits. The chamber status is read every
+        `chamber_period` seconds while the sweep loops sleep.
+        '''
+        self.disableWatchdog()
+        self._on_abort = on_abort
+        self._chamber_period = chamber_period
+        self._chamber_time = -np.inf
+        self.watchdog = Watchdog(self.state, limits, period=period, log=self.log)
+        self.watchdog.start()
+        return self.watchdog
+    
+    def disableWatchdog(self):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+    
+    def _safety_abort(self):
+        self._finish_outputs()
+        if self._on_abort is not None:
+            try:
+                self._on_abort(self)
+            except Exception as e:
+                self.log.error(f'Safety abort handler failed\n\t\t\t     {e!r}')
+    
+    def _publish_point(self, row, timestamp, readings):
+        '''Publishes the point to the state: only the columns read by a limit.'''
+        state = self.state
+        index = self.layout.index
+        for limit in self.watchdog.limits:
+            slot = index.get(limit.key)
+            if slot is not None:
+                state[limit.key] = float(row[slot])
+        state['temperature'], state['field'], state['current'], state['position'] = row[1:5].tolist()
+        state['time'] = timestamp
+        self._publish_readings(readings)
+    
+    def _publish_readings(self, readings):
+        state = self.state
+        for (device, (x, y)) in zip(self.devices, readings):
+            state[device.x_col] = x
+            state[device.y_col] = y
+            scale = device.full_scale
+            if scale:
+                state[device.overload_key] = max(abs(x), abs(y))/scale
+    
+    def _poll_state(self):
+        '''Reads the cryostat and the lock-ins into the state without writing a point.'''
+        state = self.state
+        if hasattr(self, 'cryostat'):
+            state['temperature'] = state[self.temp_col] = self.cryostat.temperature
+            state['field'] = state[self.field_col] = self.cryostat.field
+        self._refresh_chamber(force=True)
+        if len(self.devices) > 0:
+            self._publish_readings(self._snap_devices())
+        state['time'] = time.time()
+    
+    def _refresh_chamber(self, force=False):
+        if not hasattr(self, 'cryostat') or not hasattr(self.cryostat, 'getChamber'):
+            return
+        now = time.perf_counter()
+        if not force and (now - self._chamber_time < self._chamber_period):
+            return
+        self._chamber_time = now
+        try:
+            self.state['chamber'] = self.getChamber()
+        except Exception as e:
+            self.log.warning(f'Reading the chamber status failed\n\t\t\t     {e!r}')
+    
+    def _sleep(self, seconds, refresh=True):
+        '''
+        Sleep of the sweep loops. With a watchdog it ends early with
+        SafetyAbort when the sweep is aborted, is extended while a limit pauses
+        the sweep and refreshes the slow state entries (chamber) unless
+        `refresh` is False (instruments in use by another thread).
+        '''
+        if self.watchdog is None:
+            time.sleep(seconds)
+            return
+        deadline = time.perf_counter() + seconds
+        if refresh:
+            self._refresh_chamber()
+        self.watchdog.sleep(deadline - time.perf_counter())
+        while self.watchdog.paused:
+            if refresh:
+                self._poll_state()
+            self.watchdog.sleep(self.watchdog.period)
+    
+    def _hold(self, seconds, poll=1.0):
+        '''Waits `seconds`, interruptibly and publishing the state with a watchdog.'''
+        if self.watchdog is None:
+            time.sleep(seconds)
+            return
+        deadline = time.perf_counter() + seconds
+        while True:
+            self._poll_state()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._sleep(min(poll, remaining), refresh=False)
+    
+    def _wait_for(self, parameter, targets, *, delay=0, timeout=0, poll=1.0):
+        '''
+        cryostat.waitFor(parameter). With a watchdog the ramp to `targets`
+        ({quantity: (value, atol)}) is followed by polling instead, so the
+        state stays current and the wait can be aborted; MultiVu's own wait
+        then only covers the final settling and `delay` is held separately.
+        Polling also ends when the cryostat reports the parameter as steady
+        (isSteady) away from the target, or after `timeout` seconds (at most
+        POLL_TIMEOUT if the cryostat has no isSteady).
+        '''
+        if self.watchdog is None:
+            self.cryostat.waitFor(parameter, delay=delay, timeout=timeout)
+            return
+        steady = getattr(self.cryostat, 'isSteady', None)
+        if (steady is None) and not timeout:
+            poll_timeout = self.POLL_TIMEOUT
+        else:
+            poll_timeout = timeout
+        start = time.perf_counter()
+        while True:
+            self._poll_state()
+            if all(isclose(self.state[quantity], value, atol=atol)
+                   for (quantity, (value, atol)) in targets.items()):
+                break
+            if (steady is not None) and steady(parameter):
+                break
+            if poll_timeout and (time.perf_counter() - start > poll_timeout):
+                break
+            self._sleep(poll, refresh=False)
+        self.cryostat.waitFor(parameter, delay=0, timeout=timeout)
+        self._hold(delay, poll)
+    
+    def enableJournal(self, path, sync_every=10):
+        '''
+        Journals the sweeps of this run to `path`. If the journal already
+        exists (rerun of the same plan after a crash), completed sweeps are
+        skipped and an interrupted measurePositions continues from the last
+        completed position, appending to its existing output files. Data of
+        an interrupted step is never deleted (see _resume_outputs).
+        '''
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = SweepJournal(path, sync_every=sync_every)
+        self._step_number = 0
+        self._current_step = None
+    
+    def resume(self, path, sync_every=10):
+        if not os.path.exists(path):
+            raise Exception(f'Journal {path} does not exist')
+        self.enableJournal(path, sync_every=sync_every)
+    
+    def closeJournal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+    
+    def _journal_outputs(self, event, sync=False, **fields):
+        if (self.journal is None) or (self._current_step is None):
+            return
+        files = [group.filename for group in self.outputs]
+        offsets = [os.path.getsize(filename) if os.path.exists(filename) else 0
+                   for filename in files]
+        self.journal.record(event, self._current_step, sync=sync,
+                            files=files, offsets=offsets, **fields)
+    
+    def _completed_points(self):
+        if (self.journal is None) or (self._current_step is None):
+            return 0
+        return self.journal.completedPoints(self._current_step)
+    
+    def _resume_outputs(self):
+        '''
+        Output files of an interrupted step are never truncated. A step with
+        completed setpoints (measurePositions) appends to them; the rows
+        written after the last completed setpoint are kept and that setpoint
+        is measured again. Other steps are measured again into new files and
+        the partial ones are left as they are.
+        '''
+        if (self.journal is None) or (self._current_step is None):
+            return False
+        files, offsets = self.journal.outputs(self._current_step)
+        existing = [filename for filename in files if os.path.exists(filename)]
+        if self._completed_points() == 0:
+            for filename in existing:
+                self.log.warning(f'Partial output of the interrupted step {self._current_step}'
+                                 f' is kept in\n\t\t\t     {filename}')
+            return False
+        if (len(files) != len(self.outputs)) or (len(existing) != len(files)):
+            return False
+        for (group, filename, offset) in zip(self.outputs, files, offsets):
+            with open(filename, 'rb') as file:
+                file.seek(offset)
+                extra = file.read().count(b'\n')
+            if extra > 0:
+                self.log.warning(f'{extra} rows after the last completed setpoint'
+                                 f' are kept in\n\t\t\t     {filename}')
+            group.filename = filename
+            for device in group.devices:
+                device.current_filename = filename
+            group.rows = 0
+            if self.catalogue is not None:
+                group.rows = self.catalogue.rows(filename)
+            self.log.event('output_file', filename + ' (resumed)', path=filename)
+            # for an existing file only the columns are checked and data is appended
+            group.output.create_file_and_write_header(filename, '')
+        return True
+    
+    def enableLiveFeed(self, size=10000, port=None):
+        '''
+        Keeps the last `size` points of all columns in memory (self.live_buffer)
+        and, if `port` is given, publishes every point to local subscribers
+        (see livefeed.LiveFeedClient). Measuring devices must be added first.
+        '''
+        self.live_buffer = RingBuffer(self._point_columns(), size=size)
+        if self.live_feed is not None:
+            self.live_feed.close()
+            self.live_feed = None
+        if port is not None:
+            self.live_feed = LiveFeed(port)
+            
+    def _initialize_reducer(self, group):
+        if self.reduction is None:
+            group.reducer = None
+            return
+        group.reducer = StreamReducer(group.columns, group.measured_columns,
+                                      group.name, **self.reduction)
+        group.output.add_multiple_columns(group.reducer.extra_columns)
+    
+    def _new_output(self):
+        if self.compression is None:
+            return mvd.MultiVuDataFile()
+        return CompressedDataFile(self.compression)
+    
+    def _source_columns(self, devices=None):
+        if devices is None:
+            devices = self.devices
+        names = set(device.source_name for device in devices)
+        return [f'I_{name} (A)' for name in self.current_sources if name in names]
+    
+    def _point_columns(self):
+        columns = [self.time_col] + self.COMMON_OUTPUT_COLUMNS + self._source_columns()
+        for device in self.devices:
+            columns += device.columns
+        return columns + self.hooks.columns
+    
+    def _compile_layout(self):
+        '''
+        Row of one acquisition point: time stamp, common columns, currents of
+        the additional sources, three columns (X, Y, R) per device and the
+        columns of the hooks, in this order. save_datapoint() fills it by position and every output group
+        takes its columns by slot.
+        '''
+        self.layout = RowLayout(self._point_columns())
+        self._device_slots = [self.layout.index[device.x_col] for device in self.devices]
+        # currents of all sources are read once per point, index 0 is the default source
+        self._sources = [self._get_source()]
+        self._source_slots = []
+        for (name, source) in self.current_sources.items():
+            column = f'I_{name} (A)'
+            if column in self.layout.index:
+                self._sources.append(source)
+                self._source_slots.append(self.layout.index[column])
+        self._device_sources = []
+        for device in self.devices:
+            source = self.current_sources.get(device.source_name, self.current_source)
+            self._device_sources.append(self._sources.index(source))
+        self._range_slots = [(device, self.layout.index[device.sens_col])
+                             for device in self.devices if device.autoranger is not None]
+        self._time_slots = [(device, self.layout.index[device.time_col])
+                            for device in self.devices if device.timestamps]
+        self._hook_slots = {hook.name: self.layout.slots(hook.columns)
+                            for hook in self.hooks.stage('pre_point') if len(hook.columns) > 0}
+        for group in self.outputs:
+            group.compile(self.layout)
+        if (self.live_buffer is not None) and (self.live_buffer.columns != self.layout.columns):
+            self.live_buffer = RingBuffer(self.layout.columns, size=self.live_buffer.size)
+    
     def _initialize_outputs(self, one_output=True):
         if one_output:
-            output = mvd.MultiVuDataFile()
-            output.add_multiple_columns(self.COMMON_OUTPUT_COLUMNS)
-            for device in self.devices:
-                device.output = output
-                device.output.add_multiple_columns(device.columns)
-        else:    
-            for device in self.devices:
-                device.output = mvd.MultiVuDataFile()
-                device.output.add_multiple_columns(self.COMMON_OUTPUT_COLUMNS)
-                device.output.add_multiple_columns(device.columns)
+            groups = [self.devices]
+        else:
+            groups = [[device] for device in self.devices]
+        self.outputs = []
+        for devices in groups:
+            group = OutputGroup(self._new_output(), devices,
+                                self.COMMON_OUTPUT_COLUMNS + self._source_columns(devices),
+                                self.hooks.columns)
+            group.output.add_multiple_columns(group.columns)
+            self._initialize_reducer(group)
+            for device in devices:
+                device.output = group.output
+            self.outputs.append(group)
+        self._compile_layout()
     
     @staticmethod
     def _get_timpestamp():
@@ -67,74 +676,293 @@ class SetupManager():
         timestamp += f'{now.hour}-{now.minute}-{now.second}.{now.microsecond}'
         return timestamp
             
-    def save_datapoint(self, temperature, field, position=0.0):
-        current = self.current_source.current
+    def setSynchronousAcquisition(self, enabled=True, *, trigger=None):
+        '''
+        In synchronous mode all measuring devices are read concurrently in
+        parallel worker threads. Without a trigger the queries are only
+        released together: each lock-in still reports its outputs at the
+        moment its query arrives. With a trigger (e.g. a
+        trigger.GpibGroupTrigger of the lock-ins) the lock-ins store X and Y
+        in their data buffers when it fires (fast_sr830.SR830Buffer), so the
+        samples of one point are latched simultaneously, and are read back
+        concurrently afterwards.
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._barrier = None
         for device in self.devices:
-            x, y = device.instrument.snap()
-            sample_resistance = x/current
-            device.output.set_value(device.x_col, x)
-            device.output.set_value(device.y_col, y)
-            device.output.set_value(self.current_col, current)
-            device.output.set_value(device.resis_col, sample_resistance)
+            device.disableBufferedSnap()
+        self.synchronous = enabled
+        self.trigger = trigger
+        if enabled and len(self.devices) > 0:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.devices),
+                                                thread_name_prefix='snap')
+            self._barrier = threading.Barrier(len(self.devices))
+            if trigger is not None:
+                for device in self.devices:
+                    device.enableBufferedSnap()
+    
+    def _armed_snap(self, device):
+        self._barrier.wait(timeout=5)
+        return device.snap()
+    
+    def _gather(self, futures):
+        '''Results of the worker calls; after a failure the barrier is reset for the next point.'''
+        concurrent.futures.wait(futures)
+        try:
+            return [future.result() for future in futures]
+        except Exception:
+            self._barrier.reset()
+            raise
+    
+    def _snap_devices(self):
+        if not self.synchronous:
+            return [device.snap() for device in self.devices]
+        if (self._barrier is None) or (self._barrier.parties != len(self.devices)):
+            self.setSynchronousAcquisition(True, trigger=self.trigger)
+        if self.trigger is None:
+            return self._gather([self._executor.submit(self._armed_snap, device)
+                                 for device in self.devices])
+        self._gather([self._executor.submit(device.arm) for device in self.devices])
+        start = time.perf_counter()
+        self.trigger()
+        moment = (start + time.perf_counter())/2
+        return self._gather([self._executor.submit(device.read_triggered, moment)
+                             for device in self.devices])
+            
+    def save_datapoint(self, temperature, field, position=0.0):
+        '''
+        `position` may be a function of the acquisition time (time.perf_counter
+        in the middle of the lock-in reads) returning the position at that
+        moment, e.g. PositionTracker.at during a continuous scan.
+        '''
+        hooks = len(self.hooks) > 0
+        if hooks:
+            self.hooks.wait()
+            context = dict(temperature=temperature, field=field,
+                           position=None if callable(position) else position)
+            calls = self.hooks.start('pre_point', context)
+        currents = [source.current for source in self._sources]
+        acquisition_start = time.perf_counter()
+        readings = self._snap_devices()
+        moment = (acquisition_start + time.perf_counter())/2
+        if self.timestamps:
+            timestamp = self.clock.wall(moment)
+        else:
+            timestamp = time.time()
+        if callable(position):
+            position = position(moment)
+        if self.tracking_period is not None:
+            temperature, field = self._track_cryostat().at(moment)
+        row = self.layout.row
+        row[0:5] = (timestamp, temperature, field, currents[0], position)
+        for (slot, current) in zip(self._source_slots, currents[1:]):
+            row[slot] = current
+        conductances = [1/current if current != 0 else np.nan for current in currents]
+        resistances = []
+        for (slot, source, (x, y)) in zip(self._device_slots, self._device_sources, readings):
+            sample_resistance = x*conductances[source]
+            resistances.append(sample_resistance)
+            row[slot:slot + 3] = (x, y, sample_resistance)
+        for (device, slot) in self._range_slots:
+            row[slot] = device.sensitivity
+        for (device, slot) in self._time_slots:
+            row[slot] = self.clock.wall(device.snap_time)
+        if hooks:
+            self._fill_hook_columns(row, self.hooks.collect(calls))
         
-        for device in self.devices:
-            device.output.set_value(self.temp_col, temperature)
-            device.output.set_value(self.field_col, field)
-            device.output.set_value(self.pos_col, position)
-            device.output.write_data()
+        for group in self.outputs:
+            # fancy indexing copies, so the row buffer can be reused at once
+            values = row[group.slots]
+            if group.reducer is not None:
+                values = group.reducer.add(values)
+                if values is None:
+                    continue
+            self._write_values(group, values, timestamp)
+            group.rows += 1
+        
+        if self.watchdog is not None:
+            self._publish_point(row, timestamp, readings)
+        
+        if self.live_buffer is not None:
+            self.live_buffer.append_row(row)
+        if self.live_feed is not None:
+            self.live_feed.publish(self.layout.as_dict(row))
+        if hooks:
+            self.hooks.start('post_point', dict(context, resistances=resistances,
+                                                timestamp=timestamp))
+        return resistances
+    
+    def _fill_hook_columns(self, row, results):
+        for (hook, value) in results:
+            slots = self._hook_slots.get(hook.name)
+            if slots is None:
+                continue
+            if value is None:
+                value = np.nan
+            try:
+                row[slots] = value
+            except Exception as e:
+                row[slots] = np.nan
+                hook.errors += 1
+                hook.last_error = e
+    
+    def _flush_reducers(self):
+        '''Writes the incomplete blocks, so no averaged row spans two setpoints.'''
+        for group in self.outputs:
+            if group.reducer is None:
+                continue
+            values = group.reducer.flush()
+            if values is None:
+                continue
+            self._write_values(group, values, time.time())
+            group.rows += 1
+    
+    def _finish_outputs(self):
+        self.hooks.wait()
+        self._flush_reducers()
+        self._drain_writer()
+        for group in self.outputs:
+            if hasattr(group.output, 'flush'):
+                group.output.flush()
+        
+        if self.catalogue is not None:
+            for group in self.outputs:
+                if group.filename is not None:
+                    self.catalogue.updateRows(group.filename, group.rows)
     
     def create_output_files(self, title='', insert_params=dict(),
-                            one_output=False, add_config=True, add_datetime=True):
+                            one_output=None, add_config=True, add_datetime=True):
+        if one_output is None:
+            one_output = self.one_output
         if insert_params == dict():
             insert_params = self.generateLabelsDict((), ())
         labels = ('R', 'cont') + insert_params['labels']
         template = self._add_labels_to_filename(self.name, labels)
         
         self._initialize_outputs(one_output=one_output)
+        if self._resume_outputs():
+            return
         
-        for device in self.devices:
-            values = (device.name, device.contacts) + insert_params['values']
+        for group in self.outputs:
+            names = '+'.join(device.name for device in group.devices)
+            contacts = '+'.join(device.contacts for device in group.devices)
+            values = (names, contacts) + insert_params['values']
             filename = template.format(*values)
             if add_datetime:
                 filename += '_t%s' % self._get_timpestamp()
+            new_title = title
             if add_config:
-                additional_params = dict()
-                try:
-                    additional_params['Source Resistance (Ohms)'] = self.current_source.resistance
-                except: pass
-                additional_params['Source Current (A)'] = self.current_source.current
-                device_info = device.getInstrumentConfig(addition=additional_params)
-                new_title = title + device_info
-            else:
-                new_title = title
+                for device in group.devices:
+                    source = self.current_sources.get(device.source_name, self.current_source)
+                    additional_params = dict()
+                    try:
+                        additional_params['Source Resistance (Ohms)'] = source.resistance
+                    except: pass
+                    additional_params['Source Current (A)'] = source.current
+                    if device.source_name is not None:
+                        additional_params['Current Source'] = device.source_name
+                    if self.clock.remote_offset is not None:
+                        additional_params['Clock Offset (s)'] = self.clock.remote_offset
+                    if len(group.devices) > 1:
+                        new_title += f'\n; Device: {device.fullname}'
+                    new_title += device.getInstrumentConfig(addition=additional_params)
             filename += '.' + self.ext
-            device.current_filename = os.path.join(self.output_path, filename)
-            print(filename)
-            device.output.create_file_and_write_header(device.current_filename, new_title)
+            group.filename = os.path.join(self.output_path, filename)
+            for device in group.devices:
+                device.current_filename = group.filename
+            self.log.event('output_file', filename, path=group.filename, device=group.name)
+            group.output.create_file_and_write_header(group.filename, new_title)
+            group.rows = 0
+            if self.catalogue is not None:
+                self.catalogue.add(group.filename, experiment=self.name,
+                                   title=title, config=group.config if add_config else {})
+        self._journal_outputs('start', sync=True)
         
     def addMeasuringDevices(self, instruments, names, contact_pairs):
         self.add_measuring_devices(instruments, names, contact_pairs)
     
     def addCryostat(self, cryostat):
+        if isinstance(cryostat, LockedInstrument):
+            cryostat = cryostat.target
+        if self.tracking_period is not None:
+            # shared with the tracker thread, which reads the cryostat directly
+            cryostat = LockedInstrument(cryostat, self._cryostat_lock)
         self.cryostat = cryostat
     
     def addRotator(self, rotator):
         self.rotator = rotator
            
-    def addCurrentSource(self, source):
-        self.current_source = source
+    def addCurrentSource(self, source, devices=None, name=None, frequency=None):
+        '''
+        Without `devices` the source is the default one, driving every device
+        not bound to another source; its current is written to 'I (A)'.
+        With `devices` (MeasuringDevices or their names/fullnames) the source
+        drives only them, e.g. a second sample excited at its own reference
+        `frequency`, and its current is written to 'I_<name> (A)'. All lock-ins
+        are still read in the same acquisition point.
+        '''
+        if frequency is not None:
+            source.instrument.frequency = frequency
+        if devices is None:
+            self.current_source = source
+            self._check_frequencies()
+            return
+        if name is None:
+            name = str(len(self.current_sources) + 1)
+        bound = [self._find_device(device) for device in devices]
+        for device in bound:
+            device.source_name = name
+        self.current_sources[name] = source
+        if not hasattr(self, 'current_source'):
+            self.current_source = source
+        self._check_frequencies()
+    
+    def _find_device(self, device):
+        if isinstance(device, MeasuringDevice):
+            return device
+        for candidate in self.devices:
+            if device in (candidate.fullname, candidate.name):
+                return candidate
+        raise Exception(f'No measuring device {device} has been added')
+    
+    def _get_source(self, name=None):
+        if name is None:
+            if not hasattr(self, 'current_source'):
+                raise Exception('No current source has been added')
+            return self.current_source
+        if name not in self.current_sources:
+            raise Exception(f'No current source {name} has been added')
+        return self.current_sources[name]
+    
+    def _check_frequencies(self):
+        '''Warns when sources share a reference or a device is not at the frequency of its source.'''
+        try:
+            sources = [(None, self.current_source)] if hasattr(self, 'current_source') else []
+            sources += list(self.current_sources.items())
+            frequencies = {name: source.instrument.frequency for (name, source) in sources}
+            for device in self.devices:
+                frequency = frequencies.get(device.source_name)
+                if frequency is None:
+                    continue
+                if not isclose(device.instrument.frequency, frequency, atol=0, rtol=1e-3):
+                    msg = 'Lock-in {} is at {:.3f} Hz, its current source at {:.3f} Hz'
+                    self.log.warning(msg.format(device.fullname, device.instrument.frequency, frequency))
+            named = [frequencies[name] for name in self.current_sources]
+            if (len(named) > 0) and (self.current_source not in self.current_sources.values()):
+                named.append(frequencies[None])
+            if len(set(round(frequency, 3) for frequency in named)) < len(named):
+                self.log.warning('Several current sources share a reference frequency')
+        except AttributeError:
+            pass
         
-    def getCurrent(self):
-        if hasattr(self, 'current_source'):
-            return self.current_source.current
-        else:
-            raise Exception('No current source has been added')
+    def getCurrent(self, source=None):
+        return self._get_source(source).current
     
-    def setCurrent(self, value):
-        if hasattr(self, 'current_source'):
-            self.current_source.current = value
-        else:
-            raise Exception('No current source has been added')
+    def setCurrent(self, value, source=None):
+        self._get_source(source).current = value
+        self._run_hooks('setpoint', quantity='current', value=value)
         
     def getTemperature(self):
         if hasattr(self, 'cryostat'):
@@ -145,6 +973,13 @@ class SetupManager():
     def setTemperature(self, *args, **kwargs):
         if hasattr(self, 'cryostat'):
             self.cryostat.setTemperature(*args, **kwargs)
+            self._run_hooks('setpoint', quantity='temperature', value=args[0] if args else kwargs.get('temperature'))
+        else:
+            raise Exception('No cryostat has been added')
+    
+    def getChamber(self):
+        if hasattr(self, 'cryostat'):
+            return self.cryostat.getChamber()
         else:
             raise Exception('No cryostat has been added')
     
@@ -157,6 +992,7 @@ class SetupManager():
     def setPosition(self, position, *, speed=3.0):
         if hasattr(self, 'rotator'):
             self.rotator.setPosition(position, speed=speed)
+            self._run_hooks('setpoint', quantity='position', value=position)
         else:
             raise Exception('No rotator has been added')
             
@@ -169,6 +1005,7 @@ class SetupManager():
     def setField(self, *args, **kwargs):
         if hasattr(self, 'cryostat'):
             self.cryostat.setField(*args, **kwargs)
+            self._run_hooks('setpoint', quantity='field', value=args[0] if args else kwargs.get('field'))
         else:
             raise Exception ('No cryostat has been added')
         
@@ -179,11 +1016,6 @@ class SetupManager():
         parameters['values'] = values
         return parameters
     
-    @staticmethod
-    def _start_msg():
-        now = datetime.datetime.now()
-        return '[{}] '.format(now)
-    
     @staticmethod
     def _add_labels_to_filename(template: str, labels):
         for label in labels:
@@ -221,44 +1053,101 @@ class SetupManager():
                 params_new['labels'] += params['labels']
                 params_new['values'] += params['values']
             except Exception as e:
-                print('No labels or values is found in insertion parameters')
-                print(e)
+                msg = 'No labels or values is found in insertion parameters'
+                self.log.warning(f'{msg}\n\t\t\t     {e!r}')
         return params_new
     
+    def _create_ramp_files(self, kind, *, sweep, title, insert_params):
+        '''
+        Output files of an approach or return ramp, tagged ramp=<kind> in the
+        file name. Ramps are not journaled: a resumed step records its ramp
+        again into new files.
+        '''
+        params = self._add_sweep_label_to_params(insert_params, sweep=sweep)
+        params['labels'] += ('ramp=',)
+        params['values'] += (kind,)
+        step, self._current_step = self._current_step, None
+        try:
+            self.create_output_files(title=title, insert_params=params)
+        finally:
+            self._current_step = step
+        self.log.event('ramp_start', f'Recording {title}', kind=kind, sweep=sweep)
+    
+    def _measure_ramp(self, quantity, target, *, atol, rtol=0.0, interval=0.27,
+                      rate=None, stall_time=None):
+        '''
+        Measures until the already started ramp of `quantity` ('temperature',
+        'field' or 'position') at `rate` (units per second) reaches `target`
+        (see SweepTermination).
+        '''
+        if quantity == 'position':
+            value_now = self.rotator.position
+        else:
+            value_now = getattr(self.cryostat, quantity)
+        termination = SweepTermination(target, value_now, atol=atol, rtol=rtol,
+                                       rate=rate, stall_time=stall_time)
+        # at least the starting point of the ramp is measured
+        while True:
+            temperature_now, field_now = self._read_cryostat()
+            position_now = 0.0
+            if quantity == 'position':
+                position_now = self.rotator.position
+            self.save_datapoint(temperature_now, field_now, position_now)
+            value_now = {'temperature': temperature_now, 'field': field_now,
+                         'position': position_now}[quantity]
+            if termination.done(value_now):
+                break
+            self._sleep(interval)
+        self._finish_outputs()
+        if termination.reason not in ('reached', 'passed'):
+            self.log.warning(f'Ramp of {quantity}: ' + termination.message)
+        return termination
+    
+    def _record_ramp(self, kind, quantity, target, *, sweep, title, insert_params, **kwargs):
+        self._create_ramp_files(kind, sweep=sweep, title=title, insert_params=insert_params)
+        return self._measure_ramp(quantity, target, **kwargs)
+    
+    @_journaled
     def sweepTemperature(self, final_temperature, initial_temperature=None, *,
                          rate_to_final=3, rate_to_initial=5, approach='fast settle',
                          atol = 0.05, rtol=1e-16,
                          title='', insert_params={}, interval=0.27, 
-                         waiting_before=60, waiting_after=60, timeout=0):
+                         waiting_before=60, waiting_after=60, timeout=0,
+                         stall_time=None, sweep_timeout=0, adaptive=None, record_ramps=False):
         sweep_folder = os.path.join(self.base_path, 'temperature_sweeps')
         self.changeFolder(sweep_folder)
-        print()
         time.sleep(0.5)
         temperature_now = self.cryostat.temperature
         time.sleep(0.5)
         sweep_description = 'temperature sweep from {:.1f} K to {:.1f} K'
         
         if initial_temperature is not None:
-            if not np.isclose(temperature_now, initial_temperature, atol=atol, rtol=rtol):
-                msg = self._start_msg()
-                msg += 'Start changing the temperature to the initial value {:.1f} K'.format(initial_temperature)
+            if not isclose(temperature_now, initial_temperature, atol=atol, rtol=rtol):
+                msg = 'Start changing the temperature to the initial value {:.1f} K'.format(initial_temperature)
                 msg += ' (current: {:.1f} K)'.format(temperature_now)
-                print(msg)
+                self.log.info(msg)
                 self.cryostat.setTemperature(initial_temperature, rate=rate_to_initial, approach=approach)
                 time.sleep(0.5)
-                self.cryostat.waitFor('temperature', delay=waiting_before, timeout=timeout)
+                if record_ramps:
+                    self._record_ramp('approach', 'temperature', initial_temperature, sweep='Temp',
+                                      title='approach ramp to {:.1f} K'.format(initial_temperature),
+                                      insert_params=insert_params, atol=atol, rtol=rtol,
+                                      interval=interval, rate=rate_to_initial/60,
+                                      stall_time=stall_time)
+                self._wait_for('temperature', {'temperature': (initial_temperature, atol)},
+                               delay=waiting_before, timeout=timeout)
                 time.sleep(0.5)
                 temperature_now = self.cryostat.temperature
-                msg = self._start_msg()
-                msg += 'Initial temperature reached'
-                print(msg)
+                msg = 'Initial temperature reached'
+                self.log.info(msg)
                 time.sleep(0.5)
         else:
             initial_temperature = temperature_now
                  
-        msg_start = self._start_msg() + 'Start '
+        msg_start = 'Start '
         msg_start += sweep_description.format(initial_temperature, final_temperature)
-        print(msg_start)
+        self.log.event('sweep_start', msg_start, sweep='temperature',
+                       initial=initial_temperature, final=final_temperature)
         
         if title == '':
             title = sweep_description.format(initial_temperature, final_temperature)
@@ -266,61 +1155,88 @@ class SetupManager():
         self.create_output_files(title=title, insert_params=insert_params)
         
         self.cryostat.setTemperature(final_temperature, rate=rate_to_final, approach=approach)
+        self._run_hooks('setpoint', quantity='temperature', value=final_temperature)
         time.sleep(0.5)
         temperature_now = self.cryostat.temperature
+        if adaptive is not None:
+            adaptive.start(interval, rate_to_final, max_rate=self.MAX_TEMPERATURE_RATE)
+        termination = SweepTermination(final_temperature, temperature_now,
+                                       atol=atol, rtol=rtol, rate=rate_to_final/60,
+                                       stall_time=stall_time,
+                                       timeout=sweep_timeout)
         # one loop takes approximately 60ms for ppms and two lock-ins
-        while not np.isclose(temperature_now, final_temperature, atol=atol, rtol=rtol):
-            temperature_now = self.cryostat.temperature
-            field_now = self.cryostat.field
-            self.save_datapoint(temperature_now, field_now)
-            time.sleep(interval)
+        while not termination.done(temperature_now):
+            temperature_now, field_now = self._read_cryostat()
+            resistances = self.save_datapoint(temperature_now, field_now)
+            if adaptive is None:
+                self._sleep(interval)
+                continue
+            sleep_time, rate = adaptive.update(temperature_now, resistances)
+            if rate is not None:
+                self.cryostat.setTemperature(final_temperature, rate=rate, approach=approach)
+                msg = 'Temperature rate changed to {:.2f} K/min'.format(rate)
+                msg += ' (at {:.2f} K)'.format(temperature_now)
+                self.log.info(msg)
+            self._sleep(sleep_time)
+        self._finish_outputs()
             
-        msg_finish = self._start_msg() + 'Finish '
+        msg_finish = 'Finish '
         msg_finish += sweep_description.format(initial_temperature, final_temperature)
+        if termination.reason != 'reached':
+            msg_finish += '\n\t\t\t     ' + termination.message
         msg_finish += '\n\t\t\t     Waiting for temperature to stabilze'
-        print(msg_finish)
+        self.log.event('sweep_finish', msg_finish, sweep='temperature',
+                       final=final_temperature, reason=termination.reason)
         
         time.sleep(0.5)
-        self.cryostat.waitFor('temperature', delay=waiting_after, timeout=timeout)
-        print(self._start_msg() + 'Temperature has stabilized\n')
+        self._wait_for('temperature', {'temperature': (final_temperature, atol)},
+                       delay=waiting_after, timeout=timeout)
+        self.log.event('settled', 'Temperature has stabilized\n', sweep='temperature')
         time.sleep(0.5)
     
+    @_journaled
     def sweepField(self, final_field, initial_field=None, *,
                    rate_to_final=80, rate_to_initial=80,
                    approach='linear', mode='driven',
                    atol = 1, rtol=1e-16,
                    title='', insert_params={}, interval=0.27, 
-                   waiting_before=60, waiting_after=60, timeout=0):
+                   waiting_before=60, waiting_after=60, timeout=0,
+                   stall_time=None, sweep_timeout=0, adaptive=None, record_ramps=False):
         sweep_folder = os.path.join(self.base_path, 'field_sweeps')
         self.changeFolder(sweep_folder)
-        print()
         time.sleep(0.5)
         field_now = self.cryostat.field
         time.sleep(0.5)
         sweep_description = 'field sweep from {:.0f} Oe to {:.0f} Oe'
         
         if initial_field is not None:
-            if not np.isclose(field_now, initial_field, atol=atol, rtol=rtol):
-                msg = self._start_msg()
-                msg += 'Start changing the field to the initial value {:.0f} Oe'.format(initial_field)
+            if not isclose(field_now, initial_field, atol=atol, rtol=rtol):
+                msg = 'Start changing the field to the initial value {:.0f} Oe'.format(initial_field)
                 msg += ' (current: {:.0f} Oe)'.format(field_now)
-                print(msg)
+                self.log.info(msg)
                 self.cryostat.setField(initial_field, rate=rate_to_initial,
                                        approach=approach, mode=mode)
                 time.sleep(0.5)
-                self.cryostat.waitFor('field', delay=waiting_before, timeout=timeout)
+                if record_ramps:
+                    self._record_ramp('approach', 'field', initial_field, sweep='Field',
+                                      title='approach ramp to {:.0f} Oe'.format(initial_field),
+                                      insert_params=insert_params, atol=atol, rtol=rtol,
+                                      interval=interval, rate=rate_to_initial,
+                                      stall_time=stall_time)
+                self._wait_for('field', {'field': (initial_field, atol)},
+                               delay=waiting_before, timeout=timeout)
                 time.sleep(0.5)
                 field_now = self.cryostat.field
-                msg = self._start_msg()
-                msg += 'Initial field has reached'
-                print(msg)
+                msg = 'Initial field has reached'
+                self.log.info(msg)
                 time.sleep(0.5)
         else:
             initial_field = field_now
                 
-        msg_start = self._start_msg() + 'Start '
+        msg_start = 'Start '
         msg_start += sweep_description.format(initial_field, final_field)
-        print(msg_start)
+        self.log.event('sweep_start', msg_start, sweep='field',
+                       initial=initial_field, final=final_field)
             
         if title == '':
             title = sweep_description.format(initial_field, final_field)
@@ -328,35 +1244,55 @@ class SetupManager():
         self.create_output_files(title=title, insert_params=insert_params)
         
         self.cryostat.setField(final_field, rate=rate_to_final, approach=approach, mode=mode)
+        self._run_hooks('setpoint', quantity='field', value=final_field)
         time.sleep(0.5)
         field_now = self.cryostat.field
-        while not np.isclose(field_now, final_field, atol=atol, rtol=rtol):
-            temperature_now = self.cryostat.temperature
-            field_now = self.cryostat.field
-            self.save_datapoint(temperature_now, field_now)
-            time.sleep(interval)
+        if adaptive is not None:
+            adaptive.start(interval, rate_to_final, max_rate=self.MAX_FIELD_RATE)
+        termination = SweepTermination(final_field, field_now,
+                                       atol=atol, rtol=rtol, rate=rate_to_final,
+                                       stall_time=stall_time,
+                                       timeout=sweep_timeout)
+        while not termination.done(field_now):
+            temperature_now, field_now = self._read_cryostat()
+            resistances = self.save_datapoint(temperature_now, field_now)
+            if adaptive is None:
+                self._sleep(interval)
+                continue
+            sleep_time, rate = adaptive.update(field_now, resistances)
+            if rate is not None:
+                self.cryostat.setField(final_field, rate=rate, approach=approach, mode=mode)
+                msg = 'Field rate changed to {:.1f} Oe/s'.format(rate)
+                msg += ' (at {:.0f} Oe)'.format(field_now)
+                self.log.info(msg)
+            self._sleep(sleep_time)
+        self._finish_outputs()
             
-        msg_finish = self._start_msg() + 'Finish '
+        msg_finish = 'Finish '
         msg_finish += sweep_description.format(initial_field, final_field)
+        if termination.reason != 'reached':
+            msg_finish += '\n\t\t\t     ' + termination.message
         msg_finish += '\n\t\t\t     Waiting for field to stabilze'
-        print(msg_finish)
+        self.log.event('sweep_finish', msg_finish, sweep='field',
+                       final=final_field, reason=termination.reason)
         
         time.sleep(0.5)
-        self.cryostat.waitFor('field', delay=waiting_after, timeout=timeout)
-        print(self._start_msg() + 'Field has stabilized\n')
+        self._wait_for('field', {'field': (final_field, atol)},
+                       delay=waiting_after, timeout=timeout)
+        self.log.event('settled', 'Field has stabilized\n', sweep='field')
         time.sleep(0.5)
      
+    @_journaled
     def sweepTime(self, title='', insert_params={}, interval=0.27):
         sweep_folder = os.path.join(self.base_path, 'time_sweeps')
         self.changeFolder(sweep_folder)
-        print()
         sweep_description = 'sweep over time'
         # one loop takes approximately 60ms
         try:
-            msg_start = self._start_msg() + 'Start '
+            msg_start = 'Start '
             msg_start += sweep_description
             msg_start += "\n\t\t\t     Press 'Ctrl+C' to stop the sweep"
-            print(msg_start)
+            self.log.event('sweep_start', msg_start, sweep='time')
             
             if title == '':
                 title = sweep_description
@@ -364,20 +1300,21 @@ class SetupManager():
             self.create_output_files(title=title, insert_params=insert_params)
             
             while True:
-                field_now = self.cryostat.field
-                temperature_now = self.cryostat.temperature
+                temperature_now, field_now = self._read_cryostat()
                 self.save_datapoint(temperature_now, field_now)
-                time.sleep(interval)
+                self._sleep(interval)
                 
         except KeyboardInterrupt:
-            print('\t\t\t     Terminated by user (keyboard interruption)')
+            self.log.warning('Terminated by user (keyboard interruption)')
+        except SafetyAbort:
+            raise
         except Exception as e:
-            print('\t\t\t     Sweep is interrupted by exception')
-            print(e)
+            self.log.error(f'Sweep is interrupted by exception\n\t\t\t     {e!r}')
         finally:
-            msg_finish = self._start_msg() + 'Finish '
+            self._finish_outputs()
+            msg_finish = 'Finish '
             msg_finish += sweep_description
-            print(msg_finish + '\n')
+            self.log.event('sweep_finish', msg_finish + '\n', sweep='time')
     
     def _one_point_measurement(self, interval=0.27):
         field_now = self.cryostat.field
@@ -385,18 +1322,18 @@ class SetupManager():
         position_now = self.rotator.position
         
         self.save_datapoint(temperature_now, field_now, position_now)
-        time.sleep(interval)
+        self._sleep(interval)
            
+    @_journaled
     def doNMeasurements(self, N, *, interval=0.27, title='', insert_params={}):
         sweep_folder = os.path.join(self.base_path, 'time_sweeps')
         self.changeFolder(sweep_folder)
-        print()
         time.sleep(0.5)
         sweep_description = '{} measurements'
         
-        msg_start = self._start_msg() + 'Start '
+        msg_start = 'Start '
         msg_start += sweep_description.format(N)
-        print(msg_start)
+        self.log.event('sweep_start', msg_start, sweep='time', N=N)
         
         if title == '':
             title = sweep_description.format(N)
@@ -404,25 +1341,25 @@ class SetupManager():
         self.create_output_files(title=title, insert_params=insert_params)
         
         for _ in range(N):
-            field_now = self.cryostat.field
-            temperature_now = self.cryostat.temperature
+            temperature_now, field_now = self._read_cryostat()
             self.save_datapoint(temperature_now, field_now)
-            time.sleep(interval)
+            self._sleep(interval)
+        self._finish_outputs()
             
-        msg_finish = self._start_msg() + 'Finish '
+        msg_finish = 'Finish '
         msg_finish += sweep_description.format(N)
-        print(msg_finish + '\n')
+        self.log.event('sweep_finish', msg_finish + '\n', sweep='time', N=N)
         
+    @_journaled
     def measureForNSeconds(self, N, *, interval=0.27, title='', insert_params={}):
         sweep_folder = os.path.join(self.base_path, 'time_sweeps')
         self.changeFolder(sweep_folder)
-        print()
         time.sleep(0.5)
         sweep_description = 'measurements for {} seconds'
         
-        msg_start = self._start_msg() + 'Start '
+        msg_start = 'Start '
         msg_start += sweep_description.format(N)
-        print(msg_start)
+        self.log.event('sweep_start', msg_start, sweep='time', N=N)
         
         if title == '':
             title = sweep_description.format(N)
@@ -431,115 +1368,131 @@ class SetupManager():
         
         measurement_start = time.perf_counter()
         while True:
-            field_now = self.cryostat.field
-            temperature_now = self.cryostat.temperature
+            temperature_now, field_now = self._read_cryostat()
             self.save_datapoint(temperature_now, field_now)
-            time.sleep(interval)
+            self._sleep(interval)
             elapsed_time = time.perf_counter()
             if elapsed_time - measurement_start >= N:
                 break
+        self._finish_outputs()
             
-        msg_finish = self._start_msg() + 'Finish '
+        msg_finish = 'Finish '
         msg_finish += sweep_description.format(N)
-        print(msg_finish + '\n')   
+        self.log.event('sweep_finish', msg_finish + '\n', sweep='time', N=N)   
             
+    @_journaled
     def sweepCurrent(self, final_current, *, initial_current=0, step=50e-9,
                      interval=0.5, points_per_current=3,
-                     title='', insert_params={}, set_zero=True):
+                     title='', insert_params={}, set_zero=True, record_ramps=False,
+                     source=None):
         sweep_folder = os.path.join(self.base_path, 'current_sweeps')
         self.changeFolder(sweep_folder)
-        print()
         time.sleep(0.5)
         sweep_description = 'current sweep from {:.2E} A to {:.2E} A'
+        current_source = self._get_source(source)
         
-        current_now = self.current_source.current
-        if not np.isclose(current_now, initial_current, atol=step, rtol=1e-16):
-            msg = self._start_msg()
-            msg += 'Start changing the current to the initial value {:.2E} A'.format(initial_current)
+        current_now = current_source.current
+        if not isclose(current_now, initial_current, atol=step, rtol=1e-16):
+            msg = 'Start changing the current to the initial value {:.2E} A'.format(initial_current)
             msg += ' (current: {:.2E} A)'.format(current_now)
-            print(msg)
+            self.log.info(msg)
             current_range = np.arange(current_now, initial_current + step, step)
             for current in current_range:
-                self.current_source.current = current
-                time.sleep(interval)
+                current_source.current = current
+                self._sleep(interval)
             time.sleep(1)
-            current_now = self.current_source.current
-            msg = self._start_msg()
-            msg += 'Initial current reached'
-            print(msg)
+            current_now = current_source.current
+            msg = 'Initial current reached'
+            self.log.info(msg)
             time.sleep(0.5)
         
-        msg_start = self._start_msg() + 'Start '
+        msg_start = 'Start '
         msg_start += sweep_description.format(initial_current, final_current)
-        print(msg_start)
+        self.log.event('sweep_start', msg_start, sweep='current',
+                       initial=initial_current, final=final_current)
         
         if title == '':
             title = sweep_description.format(initial_current, final_current)
-        insert_params = self._add_sweep_label_to_params(insert_params, sweep='Current')
-        self.create_output_files(title=title, insert_params=insert_params)
+        sweep_params = self._add_sweep_label_to_params(insert_params, sweep='Current')
+        self.create_output_files(title=title, insert_params=sweep_params)
         
         field_now = self.cryostat.field
         temperature_now = self.cryostat.temperature
         current_range = np.arange(initial_current, final_current + step, step)
         
         for current in current_range:
-            self.current_source.current = current
+            current_source.current = current
+            self._run_hooks('setpoint', quantity='current', value=current)
             for _ in range(points_per_current):
-                field_now = self.cryostat.field
-                temperature_now = self.cryostat.temperature
+                temperature_now, field_now = self._read_cryostat()
                 self.save_datapoint(temperature_now, field_now)
-                time.sleep(interval)
-        msg_finish = self._start_msg() + 'Finish '
+                self._sleep(interval)
+        self._finish_outputs()
+        msg_finish = 'Finish '
         msg_finish += sweep_description.format(initial_current, final_current)
-        print(msg_finish)
+        self.log.event('sweep_finish', msg_finish, sweep='current', final=final_current)
         
         if set_zero:
-            msg = self._start_msg() + 'Start changing current to zero'
-            print(msg)
+            msg = 'Start changing current to zero'
+            self.log.info(msg)
+            if record_ramps:
+                self._create_ramp_files('return', sweep='Current',
+                                        title='return ramp of the current to zero',
+                                        insert_params=insert_params)
             current_range = np.arange(final_current, -step, -step)
             for current in current_range:
-                self.current_source.current = current
-                time.sleep(interval)
-            msg = self._start_msg() + 'Current is set to zero\n'
-            print(msg)
+                current_source.current = current
+                self._sleep(interval)
+                if record_ramps:
+                    self.save_datapoint(*self._read_cryostat())
+            if record_ramps:
+                self._finish_outputs()
+            msg = 'Current is set to zero\n'
+            self.log.info(msg)
         else:
-            msg_warning = self._start_msg() + 'WARNING! Current is at final value '
-            msg_warning += '({:.2E} A)\n'.format(self.current_source.current)
-            print(msg_warning)
+            msg_warning = 'WARNING! Current is at final value '
+            msg_warning += '({:.2E} A)\n'.format(current_source.current)
+            self.log.warning(msg_warning)
         
+    @_journaled
     def sweepPosition(self, final_position, initial_position=None, *,
                          speed_to_final=3, speed_to_initial=5,
                          atol = 0.02, rtol=1e-16,
                          title='', insert_params={},
-                         interval=0.27, waiting_before=60, waiting_after=60):
+                         interval=0.27, waiting_before=60, waiting_after=60,
+                         stall_time=None, sweep_timeout=0, record_ramps=False):
         sweep_folder = os.path.join(self.base_path, 'position_sweeps')
         self.changeFolder(sweep_folder)
-        print()
         time.sleep(0.5)
         position_now = self.rotator.position
         time.sleep(0.5)
         sweep_description = 'position sweep from {:.2f} Deg to {:.2f} Deg'
         
         if initial_position is not None:
-            if not np.isclose(position_now, initial_position, atol=atol, rtol=rtol):
-                msg = self._start_msg()
-                msg += 'Start changing the position to the initial value {:.2f} Deg'.format(initial_position)
+            if not isclose(position_now, initial_position, atol=atol, rtol=rtol):
+                msg = 'Start changing the position to the initial value {:.2f} Deg'.format(initial_position)
                 msg += ' (current: {:.2f} Deg)'.format(position_now)
-                print(msg)
+                self.log.info(msg)
                 self.rotator.setPosition(initial_position, speed=speed_to_initial)
-                time.sleep(waiting_before)
+                if record_ramps:
+                    self._record_ramp('approach', 'position', initial_position, sweep='Position',
+                                      title='approach ramp to {:.2f} Deg'.format(initial_position),
+                                      insert_params=insert_params, atol=atol, rtol=rtol,
+                                      interval=interval, rate=speed_to_initial,
+                                      stall_time=stall_time)
+                self._hold(waiting_before)
                 time.sleep(0.5)
                 position_now = self.rotator.position
-                msg = self._start_msg()
-                msg += 'Initial position reached'
-                print(msg)
+                msg = 'Initial position reached'
+                self.log.info(msg)
                 time.sleep(0.5)
         else:
             initial_position = position_now
                  
-        msg_start = self._start_msg() + 'Start '
+        msg_start = 'Start '
         msg_start += sweep_description.format(initial_position, final_position)
-        print(msg_start)
+        self.log.event('sweep_start', msg_start, sweep='position',
+                       initial=initial_position, final=final_position)
         
         if title == '':
             title = sweep_description.format(initial_position, final_position)
@@ -547,128 +1500,203 @@ class SetupManager():
         self.create_output_files(title=title, insert_params=insert_params)
         
         self.rotator.setPosition(final_position, speed=speed_to_final)
+        self._run_hooks('setpoint', quantity='position', value=final_position)
         time.sleep(0.5)
         position_now = self.rotator.position
+        termination = SweepTermination(final_position, position_now,
+                                       atol=atol, rtol=rtol, rate=speed_to_final,
+                                       stall_time=stall_time,
+                                       timeout=sweep_timeout)
         # one loop takes approximately 60ms for ppms and two lock-ins
-        while not np.isclose(position_now, final_position, atol=atol, rtol=rtol):
+        while not termination.done(position_now):
             position_now = self.rotator.position
-            temperature_now = self.cryostat.temperature
-            field_now = self.cryostat.field
+            temperature_now, field_now = self._read_cryostat()
             self.save_datapoint(temperature_now, field_now, position_now)
-            time.sleep(interval)
+            self._sleep(interval)
+        self._finish_outputs()
             
-        msg_finish = self._start_msg() + 'Finish '
+        msg_finish = 'Finish '
         msg_finish += sweep_description.format(initial_position, final_position)
+        if termination.reason != 'reached':
+            msg_finish += '\n\t\t\t     ' + termination.message
         msg_finish += '\n\t\t\t     Waiting for position (why?)'
-        print(msg_finish)
+        self.log.event('sweep_finish', msg_finish, sweep='position',
+                       final=final_position, reason=termination.reason)
         
-        time.sleep(waiting_after)
-        print(self._start_msg() + 'Position settled\n')
+        self._hold(waiting_after)
+        self.log.event('settled', 'Position settled\n', sweep='position')
         time.sleep(0.5)
         
+    def _wait_for_position(self, target, *, speed, atol, stall_time=None, poll=0.2):
+        '''
+        Polls the rotator until it reaches `target` instead of sleeping for the
+        worst-case travel time; gives up when the position stops changing (see
+        SweepTermination) or after the travel time plus 30 seconds.
+        '''
+        position_now = self.rotator.position
+        termination = SweepTermination(target, position_now, atol=atol, rate=speed,
+                                       stall_time=stall_time,
+                                       timeout=abs(target - position_now)/speed + 30)
+        while not termination.done(position_now):
+            self._sleep(poll)
+            position_now = self.rotator.position
+        if termination.reason not in ('reached', 'passed'):
+            self.log.warning('Waiting for position {:.2f} Deg: '.format(target) + termination.message)
+        return position_now
+    
+    def _scan_to_position(self, target, *, speed, atol, interval, stall_time=None):
+        '''
+        Moves the rotator to `target` at constant `speed` and measures all the
+        way; the position is read concurrently and interpolated to the time of
+        every lock-in reading.
+        '''
+        tracker = PositionTracker(lambda: self.rotator.position)
+        position_now = self.rotator.position
+        termination = SweepTermination(target, position_now, atol=atol, rate=speed,
+                                       stall_time=stall_time)
+        self.rotator.setPosition(target, speed=speed)
+        self._run_hooks('setpoint', quantity='position', value=target)
+        with tracker:
+            while not termination.done(position_now):
+                with tracker.lock:
+                    temperature_now, field_now = self._read_cryostat()
+                self.save_datapoint(temperature_now, field_now, tracker.at)
+                if tracker.latest is not None:
+                    position_now = tracker.latest
+                self._sleep(interval, refresh=False)
+        if tracker.error is not None:
+            self.log.warning(f'Reading position failed during the scan\n\t\t\t     {tracker.error!r}')
+        if termination.reason not in ('reached', 'passed'):
+            self.log.warning('Scan to {:.2f} Deg: '.format(target) + termination.message)
+    
+    @_journaled
     def measurePositions(self, positions, *, speed=3.0,
                          temperature=None, field=None, points_per_position=3, 
                          atol=0.02, rtol=1e-16, title='', insert_params={},
-                         interval=0.27, delay=60, timeout=0, set_zero=False):
+                         interval=0.27, delay=60, timeout=0, set_zero=False,
+                         continuous=False, record_ramps=False):
+        '''
+        Measures `points_per_position` points at each of `positions`. With
+        continuous=True the rotator instead moves through `positions` at
+        constant `speed` without stopping and the points are taken on the fly,
+        each with the position interpolated to the time of the reading.
+        With record_ramps=True the moves to the first position and back to
+        zero (set_zero) are measured into their own files (ramp=approach,
+        ramp=return).
+        '''
         sweep_folder = os.path.join(self.base_path, 'position_sweeps')
         self.changeFolder(sweep_folder)
-        print()
         time.sleep(0.5)
         temperature_now = self.cryostat.temperature
         field_now = self.cryostat.field
         time.sleep(0.5)
         sweep_description = 'measure positions [{:.2f} .. {:.2f}] Deg at {:.2f} K {:.2f} Oe'
         if (temperature is not None) and (field is not None):
-            if not np.isclose(temperature_now, temperature, atol=0.5, rtol=1e-16):
-                msg = self._start_msg()
-                msg += 'Setting temperature to the target value {:.1f} K'.format(temperature)
+            if not isclose(temperature_now, temperature, atol=0.5, rtol=1e-16):
+                msg = 'Setting temperature to the target value {:.1f} K'.format(temperature)
                 msg += ' (current: {:.1f} K)'.format(temperature_now)
-                print(msg)
+                self.log.info(msg)
                 self.cryostat.setTemperature(temperature)
-            if not np.isclose(field_now, field, atol=5, rtol=1e-16):
-                msg = self._start_msg()
-                msg += 'Setting field to the target value {:.0f} Oe'.format(field)
+            if not isclose(field_now, field, atol=5, rtol=1e-16):
+                msg = 'Setting field to the target value {:.0f} Oe'.format(field)
                 msg += ' (current: {:.0f} Oe)'.format(field_now)
-                print(msg)
+                self.log.info(msg)
                 self.cryostat.setField(field)
             time.sleep(0.5)
-            self.cryostat.waitFor('both', delay=delay, timeout=timeout)
-            msg = self._start_msg()
-            msg += 'Target temperature and field reached'
-            print(msg)
+            self._wait_for('both', {'temperature': (temperature, 0.5), 'field': (field, 5)},
+                           delay=delay, timeout=timeout)
+            msg = 'Target temperature and field reached'
+            self.log.info(msg)
         elif temperature is not None:
-            msg = self._start_msg()
-            msg += 'Setting temperature to the target value {:.1f} K'.format(temperature)
+            msg = 'Setting temperature to the target value {:.1f} K'.format(temperature)
             msg += ' (current: {:.1f} K)'.format(temperature_now)
-            print(msg)
+            self.log.info(msg)
             self.cryostat.setTemperature(temperature)
             time.sleep(0.5)
-            self.cryostat.waitFor('temperature', delay=delay, timeout=timeout)
-            msg = self._start_msg()
-            msg += 'Target temperature reached'
-            print(msg)
+            self._wait_for('temperature', {'temperature': (temperature, 0.5)},
+                           delay=delay, timeout=timeout)
+            msg = 'Target temperature reached'
+            self.log.info(msg)
         elif field is not None:
-            msg = self._start_msg()
-            msg += 'Setting field to the target value {:.0f} Oe'.format(field)
+            msg = 'Setting field to the target value {:.0f} Oe'.format(field)
             msg += ' (current: {:.0f} Oe)'.format(field_now)
-            print(msg)
+            self.log.info(msg)
             self.cryostat.setField(field)
             time.sleep(0.5)
-            self.cryostat.waitFor('field', delay=delay, timeout=timeout)
-            msg = self._start_msg()
-            msg += 'Target field reached'
-            print(msg)
+            self._wait_for('field', {'field': (field, 5)}, delay=delay, timeout=timeout)
+            msg = 'Target field reached'
+            self.log.info(msg)
         
         time.sleep(0.5)
         temperature_now = self.cryostat.temperature
         field_now = self.cryostat.field
         position_now = self.rotator.position
         
-        initial_position = positions[0]
+        completed = self._completed_points()
+        start_index = min(completed, len(positions) - 1)
+        if continuous and (completed > 0):
+            # the scan is resumed from the end of the last completed segment
+            start_index = completed - 1
+        initial_position = positions[start_index]
         final_position = positions[-1]
-        if not np.isclose(initial_position, position_now, atol=atol, rtol=rtol):
-            msg = self._start_msg()
-            msg += 'Setting position to the initial value {:.2f} Deg'.format(initial_position)
+        if not isclose(initial_position, position_now, atol=atol, rtol=rtol):
+            msg = 'Setting position to the initial value {:.2f} Deg'.format(initial_position)
             msg += ' (current: {:.2f} Deg)'.format(position_now)
-            print(msg)
+            self.log.info(msg)
             self.rotator.setPosition(initial_position, speed=speed)
-            waiting_time = abs(initial_position - position_now)/speed
-            time.sleep(waiting_time + 30)
-            position_now = self.rotator.position
-            msg = self._start_msg()
-            msg += 'Initial position reached'
-            print(msg)
+            if record_ramps:
+                self._record_ramp('approach', 'position', initial_position, sweep='Position',
+                                  title='approach ramp to {:.2f} Deg'.format(initial_position),
+                                  insert_params=insert_params, atol=atol, rtol=rtol,
+                                  interval=interval, rate=speed)
+            position_now = self._wait_for_position(initial_position, speed=speed, atol=atol)
+            msg = 'Initial position reached'
+            self.log.info(msg)
             time.sleep(0.5)
         
-        msg_start = self._start_msg() + 'Start '
+        msg_start = 'Start '
         msg_start += sweep_description.format(initial_position, final_position, temperature_now, field_now)
-        print(msg_start)
+        self.log.event('sweep_start', msg_start, sweep='positions', positions=list(positions),
+                       temperature=temperature_now, field=field_now)
         
         if title == '':
-            title = sweep_description.format(initial_position, final_position, temperature_now, field_now)
-        insert_params = self._add_sweep_label_to_params(insert_params, sweep='Position')
-        self.create_output_files(title=title, insert_params=insert_params)
+            title = sweep_description.format(positions[0], final_position, temperature_now, field_now)
+        sweep_params = self._add_sweep_label_to_params(insert_params, sweep='Position')
+        self.create_output_files(title=title, insert_params=sweep_params)
         
-        for position in positions:
+        for (index, position) in enumerate(positions):
+            if index < completed:
+                continue
+            if continuous:
+                if index > 0:
+                    self._scan_to_position(position, speed=speed, atol=atol, interval=interval)
+                self._finish_outputs()
+                self._journal_outputs('point', index=index, position=position)
+                continue
             self.rotator.setPosition(position, speed=speed)
-            time.sleep(1.25)
+            self._run_hooks('setpoint', quantity='position', value=position)
+            self._wait_for_position(position, speed=speed, atol=atol)
             for _ in range(points_per_position):
-                field_now = self.cryostat.field
-                temperature_now = self.cryostat.temperature
+                temperature_now, field_now = self._read_cryostat()
                 position_now = self.rotator.position
                 self.save_datapoint(temperature_now, field_now, position_now)
-                time.sleep(interval)
+                self._sleep(interval)
+            self._finish_outputs()
+            self._journal_outputs('point', index=index, position=position)
         
         if set_zero:
-            print(self._start_msg() + 'Start changing the position to zero')
+            self.log.info('Start changing the position to zero')
             self.rotator.setPosition(0.0, speed=speed)
-            waiting_time = abs(final_position)/speed
-            time.sleep(waiting_time + 30)
-            print(self._start_msg() + 'Position is set to zero\n')
+            if record_ramps:
+                self._record_ramp('return', 'position', 0.0, sweep='Position',
+                                  title='return ramp to 0 Deg', insert_params=insert_params,
+                                  atol=atol, rtol=rtol, interval=interval, rate=speed)
+            self._wait_for_position(0.0, speed=speed, atol=atol)
+            self.log.info('Position is set to zero\n')
         else:
-            msg_warning = self._start_msg() + 'Position is at final value '
+            msg_warning = 'Position is at final value '
             msg_warning += '({:.2f} Deg)\n'.format(self.rotator.position)
-            print(msg_warning)
+            self.log.warning(msg_warning)
         
         
         
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+standin_server.py is a stand-in for MultiVuServer which runs anywhere: it
+speaks the MultiPyVu socket protocol, so DynacoolCryostat and
+MultiPyVu.MultiVuClient connect to it unchanged, and answers from a
+DummyDynacool model instead of MultiVu. Every request can be delayed by a
+fixed latency plus random jitter, and faults (error answers, dropped
+connections, stalls) can be injected, to benchmark the client transport
+without a cryostat.
+
+    python standin_server.py --port 5000 --latency 0.02 --jitter 0.005
+
+"""
+
+import argparse
+import json
+import random
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+from MultiPyVu.__version import __version__ as mpv_version
+
+from dummies import DummyDynacool
+
+
+_HEADER = struct.Struct('>H')
+
+# MultiVu enums sent in the queries
+_TEMPERATURE_APPROACH = {0: 'fast settle', 1: 'no overshoot'}
+_FIELD_APPROACH = {0: 'linear', 1: 'no overshoot', 2: 'oscillate'}
+_FIELD_MODE = {0: 'persistent', 1: 'driven'}
+_WAIT_TEMPERATURE, _WAIT_FIELD, _WAIT_POSITION = 1, 2, 4
+_WAIT_GOOD, _WAIT_TIMED_OUT = 0, 258
+
+
+class Faults():
+    '''
+    Fault injection of the stand-in server, each a probability per request:
+    `error` answers with a MultiPyVuError, `drop` closes the connection
+    without an answer, `stall` delays the answer by `stall_time` seconds.
+    '''
+    def __init__(self, *, error=0.0, drop=0.0, stall=0.0, stall_time=1.0):
+        self.error = error
+        self.drop = drop
+        self.stall = stall
+        self.stall_time = stall_time
+
+
+class _Connection(Exception):
+    pass
+
+
+def _receive(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise _Connection('Client closed the connection')
+        data += chunk
+    return data
+
+
+def read_message(sock):
+    '''Reads one framed message: header length, JSON header, JSON content.'''
+    (header_length,) = _HEADER.unpack(_receive(sock, _HEADER.size))
+    header = json.loads(_receive(sock, header_length).decode('utf-8'))
+    content = _receive(sock, header['message-length'])
+    return json.loads(content.decode(header['message-encoding']))
+
+
+def write_message(sock, content, encoding='utf-8'):
+    content = json.dumps(content, ensure_ascii=False).encode(encoding)
+    header = json.dumps({'byteorder': sys.byteorder,
+                         'message-type': 'text/json',
+                         'message-encoding': encoding,
+                         'message-length': len(content)}).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(header)) + header + content)
+
+
+class StandinServer(socketserver.ThreadingTCPServer):
+    '''
+    MultiVuServer stand-in answering from `model` (a DummyDynacool by
+    default). Unlike the real server any number of clients can be connected
+    at the same time; their requests are served by one thread per client and
+    serialized on the model, like MultiVu does. Each answer is delayed by
+    `latency` plus an exponentially distributed `jitter` (mean, seconds).
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=5000, *, model=None, latency=0.0,
+                 jitter=0.0, faults=None, seed=None):
+        super().__init__((host, port), _Handler)
+        if model is None:
+            model = DummyDynacool()
+        model.open()
+        self.model = model
+        self.model_lock = threading.Lock()
+        self.latency = latency
+        self.jitter = jitter
+        self.faults = faults if faults is not None else Faults()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = dict(connections=0, requests=0, errors=0, drops=0, stalls=0)
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.server_address[:2]
+
+    def start(self):
+        '''Serves on a background thread.'''
+        self.thread = threading.Thread(target=self.serve_forever, name='standin-server',
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args, **kwargs):
+        self.stop()
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def draw(self):
+        '''Delay and fault ('error', 'drop' or None) of the next request.'''
+        with self.lock:
+            delay = self.latency
+            if self.jitter > 0:
+                delay += self.random.expovariate(1/self.jitter)
+            if self.random.random() < self.faults.stall:
+                delay += self.faults.stall_time
+                self.stats['stalls'] += 1
+            fault = None
+            chance = self.random.random()
+            if chance < self.faults.drop:
+                fault = 'drop'
+            elif chance < self.faults.drop + self.faults.error:
+                fault = 'error'
+        return delay, fault
+
+    def _start_query(self):
+        # version; option flags (s - scaffolding, as no MultiVu is behind it)
+        return f'{mpv_version};s'
+
+    def answer(self, action, query):
+        '''Result string of a MultiVu command, as CommandMultiVu formats it.'''
+        model = self.model
+        with self.model_lock:
+            if action == 'TEMP?':
+                value = model.temperature
+                state = 'Stable' if value == model.set_temperature else 'Tracking'
+                return f'{value},K,{state}'
+            if action == 'FIELD?':
+                value = model.field
+                state = 'Holding (driven)' if value == model.set_field else 'Ramping'
+                return f'{value},Oe,{state}'
+            if action == 'POSITION?':
+                value = model.position
+                if value == model.set_position:
+                    state = 'Transport stopped at set point'
+                else:
+                    state = 'Transport moving toward set point'
+                return f'{value},Deg,{state}'
+            if action == 'CHAMBER?':
+                return '0.0,,Sealed'
+            if action == 'WAITFOR?':
+                return f'{int(self._steady(int(query or 0)))},,'
+            if action == 'TEMP':
+                set_point, rate, approach = query.split(',')
+                model.setTemperature(float(set_point), rate=float(rate),
+                                     approach=_TEMPERATURE_APPROACH[int(approach)])
+                return 'TEMP Command Received'
+            if action == 'FIELD':
+                set_point, rate, approach, mode = query.split(',')
+                model.setField(float(set_point), rate=float(rate),
+                               approach=_FIELD_APPROACH[int(approach)],
+                               mode=_FIELD_MODE[int(mode)])
+                return 'FIELD Command Received'
+            if action == 'POSITION':
+                set_point, rate = query.split(',')
+                model.setPosition(float(set_point), speed=float(rate))
+                return 'POSITION Command Received'
+            if action == 'CHAMBER':
+                return 'CHAMBER Command Received'
+        if action == 'WAITFOR':
+            delay, timeout, bitmask = query.split(',')
+            code = self._wait_for(float(delay), float(timeout), int(bitmask))
+            return f'WAITFOR Command Received,{code}'
+        return f"MultiPyVuError: The command '{action}' has not been implemented."
+
+    def _steady(self, bitmask):
+        # called with the model lock held
+        model = self.model
+        steady = True
+        if bitmask & _WAIT_TEMPERATURE:
+            steady &= (model.temperature == model.set_temperature)
+        if bitmask & _WAIT_FIELD:
+            steady &= (model.field == model.set_field)
+        if bitmask & _WAIT_POSITION:
+            steady &= (model.position == model.set_position)
+        return steady
+
+    def _wait_for(self, delay, timeout, bitmask, poll=0.05):
+        start = time.perf_counter()
+        while True:
+            with self.model_lock:
+                if self._steady(bitmask):
+                    break
+            if (timeout > 0) and (time.perf_counter() - start > timeout):
+                return _WAIT_TIMED_OUT
+            time.sleep(poll)
+        time.sleep(delay)
+        return _WAIT_GOOD
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    '''One client connection: confirm, answer, wait for the acknowledgement.'''
+    def handle(self):
+        server = self.server
+        server._count('connections')
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                request = read_message(sock)
+                if request.get('message_type') == 'confirmed':
+                    continue    # late acknowledgement of a previous answer
+                if not self._serve(sock, request):
+                    return
+        except (_Connection, OSError):
+            return
+
+    def _serve(self, sock, request):
+        server = self.server
+        server._count('requests')
+        write_message(sock, dict(request, message_type='confirmed'))
+        action, query = request.get('action', ''), request.get('query', '')
+        response = dict(request, message_type='completed')
+        keep_open = True
+        if action == 'START':
+            response['query'] = server._start_query()
+            response['result'] = f'Connected to DYNACOOL MultiVuServer at {self.client_address}'
+        elif action in ('ALIVE', 'STATUS'):
+            response['query'] = action
+            response['result'] = 'connected' if action == 'STATUS' else 'Connected to DYNACOOL MultiVuServer'
+            keep_open = False
+        elif action in ('CLOSE', 'EXIT'):
+            response['query'] = action
+            response['result'] = f'Client {self.client_address} disconnected.'
+            keep_open = False
+        else:
+            delay, fault = server.draw()
+            if fault == 'drop':
+                server._count('drops')
+                return False
+            try:
+                result = server.answer(action, query)
+            except Exception as e:
+                result = f'MultiPyVuError: {e!r}'
+            if fault == 'error':
+                server._count('errors')
+                result = 'MultiPyVuError: injected fault'
+            if delay > 0:
+                time.sleep(delay)
+            response['result'] = result
+        write_message(sock, response)
+        acknowledgement = read_message(sock)
+        return keep_open and (acknowledgement.get('message_type') == 'confirmed')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='MultiVuServer stand-in backed by DummyDynacool')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0, help='fixed delay per request (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='mean random extra delay (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--stall-rate', type=float, default=0.0)
+    parser.add_argument('--stall-time', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=None)
+    options = parser.parse_args(args)
+    faults = Faults(error=options.error_rate, drop=options.drop_rate,
+                    stall=options.stall_rate, stall_time=options.stall_time)
+    server = StandinServer(options.host, options.port, latency=options.latency,
+                           jitter=options.jitter, faults=faults, seed=options.seed)
+    print(f'MultiVuServer stand-in listening on {server.address}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'Served: {server.stats}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import datetime
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import traceback
+from multiprocessing.managers import BaseManager
+
+from logger import AsyncLogger
+from termination import wait_steady
+
+
+class SerializedCryostat():
+    '''
+    Owner of the single cryostat connection inside the broker process.
+    Calls from all setups are serialized, so the MultiVu client (or the
+    QDInstrument DLL) only ever sees one request at a time.
+    '''
+    def __init__(self, cryostat):
+        self.cryostat = cryostat
+        self.lock = threading.Lock()
+    
+    def methods(self):
+        '''Public methods of the cryostat, the only ones a BrokeredCryostat exposes.'''
+        return [name for name in dir(self.cryostat)
+                if not name.startswith('_') and callable(getattr(type(self.cryostat), name, None))]
+        
+    def call(self, name, *args, **kwargs):
+        with self.lock:
+            attribute = getattr(self.cryostat, name)
+            if callable(attribute):
+                return attribute(*args, **kwargs)
+            return attribute
+
+
+_shared_cryostat = None
+
+
+def _create_shared_cryostat(factory, args, kwargs):
+    global _shared_cryostat
+    cryostat = factory(*args, **kwargs)
+    if hasattr(cryostat, 'open'):
+        cryostat.open()
+    _shared_cryostat = SerializedCryostat(cryostat)
+    
+
+def _get_shared_cryostat():
+    return _shared_cryostat
+
+
+class BrokerManager(BaseManager):
+    pass
+
+BrokerManager.register('cryostat', callable=_get_shared_cryostat)
+
+
+class BrokeredCryostat():
+    '''
+    Worker-side stand-in for DynacoolCryostat/DynacoolDLL/DummyDynacool: every
+    method of the cryostat is forwarded to the broker process, other names
+    raise AttributeError, so capability probes (hasattr) keep working.
+    '''
+    def __init__(self, address, authkey):
+        manager = BrokerManager(address=address, authkey=authkey)
+        manager.connect()
+        self._proxy = manager.cryostat()
+        self._methods = frozenset(self._proxy.methods())
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args, **kwargs):
+        return False
+    
+    def open(self):
+        pass
+    
+    def closeClient(self):
+        pass
+    
+    @property
+    def temperature(self):
+        return self._proxy.call('temperature')
+    
+    @property
+    def field(self):
+        return self._proxy.call('field')
+    
+    @property
+    def position(self):
+        return self._proxy.call('position')
+    
+    def waitFor(self, parameter, delay=0, timeout=0, poll=1.0):
+        '''
+        Polls isSteady() instead of forwarding waitFor, which would hold the
+        broker lock (and stall every other setup) for the whole wait; only a
+        cryostat without isSteady is waited for by the broker.
+        '''
+        if 'isSteady' not in self._methods:
+            return self._proxy.call('waitFor', parameter, delay=delay, timeout=timeout)
+        wait_steady(self.isSteady, parameter, delay=delay, timeout=timeout, poll=poll)
+    
+    def __getattr__(self, name):
+        if name.startswith('_') or (name not in self._methods):
+            raise AttributeError(name)
+        def method(*args, **kwargs):
+            return self._proxy.call(name, *args, **kwargs)
+        return method
+
+
+class StatusReporter():
+    def __init__(self, name, status_queue):
+        self.name = name
+        self.queue = status_queue
+    
+    def __call__(self, message, state='running', **fields):
+        status = dict(setup=self.name, state=state, message=message,
+                      time=datetime.datetime.now().isoformat(), **fields)
+        self.queue.put(status)
+
+
+def _run_worker(name, target, address, authkey, status_queue, args, kwargs):
+    report = StatusReporter(name, status_queue)
+    report('Setup started', state='started')
+    try:
+        cryostat = None
+        if address is not None:
+            cryostat = BrokeredCryostat(address, authkey)
+        target(cryostat, report, *args, **kwargs)
+    except KeyboardInterrupt:
+        report('Terminated by user (keyboard interruption)', state='stopped')
+    except Exception as e:
+        report(f'{e!r}', state='failed', traceback=traceback.format_exc())
+    else:
+        report('Setup finished', state='finished')
+
+
+class Supervisor():
+    '''
+    Runs several independent setups in their own worker processes.
+    
+    Each setup is a function target(cryostat, report, *args, **kwargs) that
+    creates its own SetupManager and instruments inside the worker process;
+    `cryostat` is a BrokeredCryostat multiplexed through a broker process
+    that owns the only connection created by `cryostat_factory`, and
+    `report(message, **fields)` sends status to the supervisor.
+    '''
+    def __init__(self, cryostat_factory=None, *args,
+                 address=('127.0.0.1', 50500), authkey=b'setup-control', **kwargs):
+        self.cryostat_factory = cryostat_factory
+        self.factory_args = args
+        self.factory_kwargs = kwargs
+        self.address = address if cryostat_factory is not None else None
+        self.authkey = authkey
+        self.setups = dict()
+        self.status = dict()
+        self.processes = dict()
+        self.status_queue = mp.Queue()
+        self.broker = None
+        self.log = AsyncLogger(f'supervisor.{id(self):x}')
+        
+    def addSetup(self, name, target, *args, **kwargs):
+        if name in self.setups:
+            raise Exception(f'Setup {name} has already been added')
+        self.setups[name] = (target, args, kwargs)
+    
+    def start(self):
+        if self.cryostat_factory is not None:
+            self.broker = BrokerManager(address=self.address, authkey=self.authkey)
+            self.broker.start(initializer=_create_shared_cryostat,
+                              initargs=(self.cryostat_factory, self.factory_args,
+                                        self.factory_kwargs))
+        for (name, (target, args, kwargs)) in self.setups.items():
+            process = mp.Process(target=_run_worker, name=name,
+                                 args=(name, target, self.address, self.authkey,
+                                       self.status_queue, args, kwargs))
+            process.start()
+            self.processes[name] = process
+            
+    def poll(self, timeout=1.0):
+        try:
+            status = self.status_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self.status[status['setup']] = status
+        level = logging.ERROR if status['state'] == 'failed' else logging.INFO
+        fields = {key: value for (key, value) in status.items() if key != 'message'}
+        self.log.log(level, '{}: {}'.format(status['setup'], status['message']), **fields)
+        return status
+    
+    def running(self):
+        return [name for (name, process) in self.processes.items() if process.is_alive()]
+    
+    def run(self):
+        self.start()
+        try:
+            while len(self.running()) > 0:
+                self.poll()
+            while self.poll(timeout=0.1) is not None:
+                pass
+        finally:
+            self.stop()
+        return self.status
+    
+    def stop(self, timeout=10):
+        for process in self.processes.values():
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+        if self.broker is not None:
+            self.broker.shutdown()
+            self.broker = None
+        self.log.close()
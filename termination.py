@@ -0,0 +1,82 @@
+import time
+
+
+def isclose(a, b, atol, rtol=0.0):
+    '''Scalar equivalent of np.isclose(a, b, atol=atol, rtol=rtol).'''
+    return abs(a - b) <= atol + rtol*abs(b)
+
+
+def wait_steady(is_steady, parameter, *, delay=0, timeout=0, poll=1.0):
+    '''
+    waitFor(parameter) by polling is_steady(parameter), so a lock shared
+    with other threads is only held for single queries. A timeout of 0
+    waits forever, like MultiVu.
+    '''
+    start = time.perf_counter()
+    while not is_steady(parameter):
+        if timeout and (time.perf_counter() - start > timeout):
+            break
+        time.sleep(poll)
+    time.sleep(delay)
+
+
+class SweepTermination():
+    '''
+    Termination condition of a ramp from `start` to `target`. done(value) is
+    True once the value is within tolerance of the target, has passed it in
+    the ramp direction, has not progressed by more than the tolerance for
+    `stall_time` seconds, or the sweep has lasted `timeout` seconds
+    (0 disables the last two checks). The cause is kept in `reason`.
+    
+    By default the stall window follows from the ramp `rate` (units per
+    second): the time to cover `stall_factor` tolerances, at least
+    `min_stall` seconds. Without a rate stall detection is off.
+    '''
+    def __init__(self, target, start, *, atol, rtol=0.0, rate=None, stall_time=None,
+                 stall_factor=20, min_stall=120, timeout=0):
+        self.target = target
+        self.tolerance = atol + rtol*abs(target)
+        if target > start:
+            self.direction = 1
+        elif target < start:
+            self.direction = -1
+        else:
+            self.direction = 0
+        if (stall_time is None) and rate:
+            stall_time = max(stall_factor*self.tolerance/abs(rate), min_stall)
+        self.stall_time = stall_time or 0
+        self.timeout = timeout
+        self.start_time = time.perf_counter()
+        self.progress_value = start
+        self.progress_time = self.start_time
+        self.reason = None
+    
+    def done(self, value):
+        distance = self.target - value
+        if -self.tolerance <= distance <= self.tolerance:
+            self.reason = 'reached'
+            return True
+        if self.direction*distance < 0:
+            self.reason = 'passed'
+            return True
+        if (self.stall_time == 0) and (self.timeout == 0):
+            return False
+        now = time.perf_counter()
+        if abs(value - self.progress_value) > self.tolerance:
+            self.progress_value = value
+            self.progress_time = now
+        elif self.stall_time and (now - self.progress_time > self.stall_time):
+            self.reason = 'stalled'
+            return True
+        if self.timeout and (now - self.start_time > self.timeout):
+            self.reason = 'timeout'
+            return True
+        return False
+    
+    @property
+    def message(self):
+        messages = {'reached': 'Target value reached',
+                    'passed': 'Target value passed',
+                    'stalled': 'Ramp stalled for {:.0f} s'.format(self.stall_time),
+                    'timeout': 'Sweep timeout ({} s) exceeded'.format(self.timeout)}
+        return messages.get(self.reason, '')
@@ -0,0 +1,125 @@
+import time
+
+import numpy as np
+
+from scanning import PositionTracker
+from termination import wait_steady
+
+
+class MonotonicClock():
+    '''
+    Wall-clock time stamps taken on time.perf_counter: the offset between
+    the two clocks is measured once (calibrate), so time stamps of one file
+    are monotonic and as fine as perf_counter, whatever NTP does to the
+    system clock meanwhile. `remote_offset` is the offset of a remote clock
+    (e.g. the MultiVu computer) to this one, see calibrate_remote().
+    '''
+    def __init__(self, samples=5):
+        self.epoch = 0.0
+        self.remote_offset = None
+        self.remote_uncertainty = None
+        self.calibrate(samples)
+
+    def calibrate(self, samples=5):
+        '''Offset of time.time to time.perf_counter, from the tightest of `samples` reads.'''
+        best = None
+        for _ in range(samples):
+            start = time.perf_counter()
+            wall = time.time()
+            finish = time.perf_counter()
+            if (best is None) or (finish - start < best[0]):
+                best = (finish - start, wall - (start + finish)/2)
+        self.epoch = best[1]
+        return self.epoch
+
+    def wall(self, moment):
+        '''Wall-clock time (s since the epoch) of a time.perf_counter moment.'''
+        return self.epoch + moment
+
+    def now(self):
+        return self.wall(time.perf_counter())
+
+    def calibrate_remote(self, read, samples=8):
+        '''
+        Offset of a remote clock to this one; `read` returns the remote time
+        (s since the epoch). Like NTP, the remote clock is assumed to be read
+        in the middle of the round trip and the read with the shortest round
+        trip is kept; half of it is the uncertainty. Returns both.
+        '''
+        best = None
+        for _ in range(samples):
+            start = time.perf_counter()
+            remote = read()
+            finish = time.perf_counter()
+            if (best is None) or (finish - start < best[0]):
+                best = (finish - start, remote - self.wall((start + finish)/2))
+        trip, self.remote_offset = best
+        self.remote_uncertainty = trip/2
+        return self.remote_offset, self.remote_uncertainty
+
+    def remote(self, moment):
+        '''Time of a time.perf_counter moment on the remote clock.'''
+        if self.remote_offset is None:
+            raise Exception('The remote clock has not been calibrated')
+        return self.wall(moment) + self.remote_offset
+
+
+class CryostatTracker(PositionTracker):
+    '''
+    Reads temperature and field on a background thread, so both can be
+    interpolated to the time of every lock-in reading during fast ramps.
+    All other queries to the cryostat must hold `lock` (see LockedInstrument).
+    '''
+    def __init__(self, cryostat, lock, *, period=0.05, history=256):
+        super().__init__(lambda: (cryostat.temperature, cryostat.field),
+                         period=period, history=history)
+        self.lock = lock
+
+    def at(self, moment, timeout=2.0):
+        '''(temperature, field) at `moment` (time.perf_counter), see PositionTracker.at.'''
+        with self.condition:
+            self.condition.wait_for(lambda: (len(self.samples) > 0)
+                                    and (self.samples[-1][0] >= moment),
+                                    timeout=timeout)
+            if len(self.samples) == 0:
+                return np.nan, np.nan
+            times, values = zip(*self.samples)
+        values = np.asarray(values, dtype=float)
+        return tuple(float(np.interp(moment, times, column)) for column in values.T)
+
+
+class LockedInstrument():
+    '''
+    Passes every access to `target` holding `lock`, e.g. shared with a
+    tracker thread. waitFor, which blocks for minutes, polls isSteady()
+    instead, so the lock is only held for single queries; a target without
+    isSteady waits without the lock.
+    '''
+    def __init__(self, target, lock):
+        object.__setattr__(self, 'target', target)
+        object.__setattr__(self, 'lock', lock)
+
+    def waitFor(self, parameter, delay=0, timeout=0, poll=1.0):
+        target = self.target
+        if not hasattr(target, 'isSteady'):
+            return target.waitFor(parameter, delay=delay, timeout=timeout)
+        def is_steady(parameter):
+            with self.lock:
+                return target.isSteady(parameter)
+        wait_steady(is_steady, parameter, delay=delay, timeout=timeout, poll=poll)
+
+    def __getattr__(self, name):
+        target = self.target
+        value = getattr(type(target), name, None)
+        if callable(value) and not isinstance(value, property):
+            method = getattr(target, name)
+            def call(*args, **kwargs):
+                with self.lock:
+                    return method(*args, **kwargs)
+            return call
+        with self.lock:
+            return getattr(target, name)
+
+    def __setattr__(self, name, value):
+        with self.lock:
+            setattr(self.target, name, value)
@@ -0,0 +1,24 @@
+import pyvisa
+
+
+class GpibGroupTrigger():
+    '''
+    Software broadcast of the GPIB group execute trigger (GET) to a set of
+    instruments sharing one GPIB board. An instance is a callable and can be
+    passed as a trigger to SetupManager.setSynchronousAcquisition, where it
+    latches one point into the data buffers of every lock-in.
+    '''
+    def __init__(self, addresses, board='GPIB0::INTFC', resource_manager=None):
+        if resource_manager is None:
+            resource_manager = pyvisa.ResourceManager()
+        self.interface = resource_manager.open_resource(board)
+        self.resources = [resource_manager.open_resource(address)
+                          for address in addresses]
+    
+    def __call__(self):
+        self.interface.group_execute_trigger(*self.resources)
+        
+    def close(self):
+        for resource in self.resources:
+            resource.close()
+        self.interface.close()
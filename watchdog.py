@@ -0,0 +1,161 @@
+import logging
+import threading
+
+
+ACTIONS = ('abort', 'pause', 'warn')
+
+
+class SafetyAbort(Exception):
+    '''Raised in the measuring thread after the watchdog aborted the sweep.'''
+
+
+class Limit():
+    '''
+    Allowed values of one entry of the shared state: low <= value <= high,
+    or value in `allowed` (e.g. chamber states). A violation seen on
+    `persist` consecutive ticks triggers `action`: 'abort' stops the sweep,
+    'pause' holds it until the value is back within the limit, 'warn' only
+    logs. Entries missing from the state are not checked.
+    '''
+    def __init__(self, key, *, low=None, high=None, allowed=None, action='abort',
+                 persist=1, name=None):
+        if action not in ACTIONS:
+            raise Exception(f'Unknown limit action {action}, expected one of {ACTIONS}')
+        if (low is None) and (high is None) and (allowed is None):
+            raise Exception(f'Limit of {key} needs low, high or allowed values')
+        self.key = key
+        self.low = low
+        self.high = high
+        self.allowed = frozenset(allowed) if allowed is not None else None
+        self.action = action
+        self.persist = persist
+        self.name = name if name is not None else key
+        self.count = 0
+        self.value = None
+
+    def violated(self, state):
+        value = state.get(self.key)
+        if value is None:
+            return False
+        self.value = value
+        if self.allowed is not None:
+            return value not in self.allowed
+        if value != value:
+            return False    # NaN, e.g. a conductance at zero current
+        return (((self.low is not None) and (value < self.low))
+                or ((self.high is not None) and (value > self.high)))
+
+    @property
+    def message(self):
+        if self.allowed is not None:
+            return f'{self.name} = {self.value!r}, allowed: {sorted(self.allowed)}'
+        value = self.value
+        if isinstance(value, (int, float)):
+            value = f'{value:g}'
+        return f'{self.name} = {value} outside [{self.low}, {self.high}]'
+
+
+class Watchdog():
+    '''
+    Checks the limits against `state` on its own thread every `period`
+    seconds; a tick is one dictionary lookup and comparison per limit. The
+    watchdog never talks to the instruments: the state is published by the
+    measuring thread (SetupManager.state), so the checks add no latency to
+    the acquisition loop. The measuring thread calls check() or sleep(),
+    which raise SafetyAbort once the sweep was aborted.
+    '''
+    def __init__(self, state, limits=(), *, period=0.5, log=None):
+        self.state = state
+        self.limits = list(limits)
+        self.period = period
+        self.log = log
+        self.reason = None
+        self.paused_by = set()
+        self._abort = threading.Event()
+        self._stop = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.stop()
+
+    def start(self):
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, name='watchdog', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            try:
+                self.tick()
+            except Exception as e:
+                # a limit that cannot be checked is not a safe one
+                self.abort(f'Safety check failed: {e!r}')
+
+    def tick(self):
+        for limit in self.limits:
+            if not limit.violated(self.state):
+                limit.count = 0
+                if limit.name in self.paused_by:
+                    self.paused_by.discard(limit.name)
+                    self._log(logging.INFO, 'safety_resume', f'Safety limit cleared: {limit.message}', limit)
+                continue
+            limit.count += 1
+            if limit.count != limit.persist:
+                continue    # acts once when the violation has persisted
+            if limit.action == 'abort':
+                self.abort(limit.message, limit)
+            elif limit.action == 'pause':
+                self.paused_by.add(limit.name)
+                self._log(logging.WARNING, 'safety_pause', f'Sweep paused: {limit.message}', limit)
+            else:
+                self._log(logging.WARNING, 'safety_warning', f'Safety limit: {limit.message}', limit)
+
+    def _log(self, level, event, message, limit=None):
+        if self.log is None:
+            return
+        fields = dict(limit=limit.name, value=limit.value) if limit is not None else {}
+        self.log.event(event, message, level=level, **fields)
+
+    def abort(self, reason, limit=None):
+        '''Aborts the running sweep (from any thread).'''
+        if self._abort.is_set():
+            return
+        self.reason = reason
+        self._abort.set()
+        self._log(logging.ERROR, 'safety_abort', f'Sweep aborted: {reason}', limit)
+
+    def reset(self):
+        '''Clears the abort and the pauses, e.g. before the next sweep.'''
+        self._abort.clear()
+        self.reason = None
+        self.paused_by.clear()
+        for limit in self.limits:
+            limit.count = 0
+
+    @property
+    def aborted(self):
+        return self._abort.is_set()
+
+    @property
+    def paused(self):
+        return len(self.paused_by) > 0
+
+    def check(self):
+        if self._abort.is_set():
+            raise SafetyAbort(self.reason)
+
+    def sleep(self, seconds):
+        '''time.sleep that ends early and raises SafetyAbort when the sweep is aborted.'''
+        if (seconds > 0) and self._abort.wait(seconds):
+            raise SafetyAbort(self.reason)
+        self.check()